@@ -4,6 +4,7 @@ __author__ = "Marvin Steadfast"
 __email__ = "marvin@xsteadfastx.org"
 __version__ = "0.0.0"
 
+from aiosonic.scheduler import Priority
 from aiosonic.sonic_api import SonicAPI
 
-__all__ = ["SonicAPI"]
+__all__ = ["Priority", "SonicAPI"]
@@ -0,0 +1,99 @@
+"""Fetching many items at once."""
+import asyncio
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+)
+
+import aiohttp
+
+from aiosonic.errors import APIError
+
+BATCH_ERRORS = (APIError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+@dataclass
+class BatchResult:
+    """The outcome of fetching one ID of a batch."""
+
+    item_id: Hashable
+    result: Optional[Any] = None
+    error: Optional[Exception] = None
+
+    @property
+    def success(self) -> bool:
+        """If the item was fetched."""
+        return self.error is None
+
+
+async def iter_batch(
+    fetch: Callable[[Any], Awaitable[Any]],
+    item_ids: Iterable[Hashable],
+    concurrency: int = 10,
+) -> AsyncIterator[BatchResult]:
+    """Fetches IDs with bounded concurrency and yields results as they complete.
+
+    Repeated IDs are fetched and yielded once. A failing ID yields a result
+    with its error instead of stopping the batch. Leaving the iteration early
+    cancels the outstanding fetches.
+
+    Args:
+        fetch (callable): Coroutine function fetching one ID.
+        item_ids (iterable): The IDs to fetch.
+        concurrency (int, optional): Fetches in flight at most. Defaults to 10.
+
+    Yields:
+        BatchResult: One result per distinct ID, in completion order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _fetch_one(item_id: Hashable) -> BatchResult:
+        async with semaphore:
+            try:
+                return BatchResult(item_id, result=await fetch(item_id))
+            except BATCH_ERRORS as error:
+                return BatchResult(item_id, error=error)
+
+    tasks = [
+        asyncio.ensure_future(_fetch_one(item_id))
+        for item_id in dict.fromkeys(item_ids)
+    ]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def fetch_batch(
+    fetch: Callable[[Any], Awaitable[Any]],
+    item_ids: Iterable[Hashable],
+    concurrency: int = 10,
+) -> List[BatchResult]:
+    """Fetches IDs with bounded concurrency and returns results in input order.
+
+    Args:
+        fetch (callable): Coroutine function fetching one ID.
+        item_ids (iterable): The IDs to fetch.
+        concurrency (int, optional): Fetches in flight at most. Defaults to 10.
+
+    Returns:
+        list: One BatchResult per input ID. Repeated IDs are fetched once and
+        share the same result.
+    """
+    item_ids = list(item_ids)
+    results: Dict[Hashable, BatchResult] = {}
+    async for result in iter_batch(fetch, item_ids, concurrency=concurrency):
+        results[result.item_id] = result
+
+    return [results[item_id] for item_id in item_ids]
@@ -0,0 +1,393 @@
+"""Load generator for Subsonic servers."""
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiosonic.metrics import LoopLagMonitor
+from aiosonic.sonic_api import SonicAPI
+
+LOGGER = logging.getLogger("SonicBench")
+
+DEFAULT_MIX: Dict[str, float] = {
+    "ping": 1.0,
+    "browse": 2.0,
+    "get_artist": 2.0,
+    "get_album": 3.0,
+    "get_song": 3.0,
+    "download": 1.0,
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class Library:
+    """IDs sampled from the library to drive the requests with."""
+
+    artist_ids: List[str] = field(default_factory=list)
+    album_ids: List[str] = field(default_factory=list)
+    song_ids: List[str] = field(default_factory=list)
+    directory_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Sample:
+    """The outcome of one request."""
+
+    endpoint: str
+    started: float
+    latency: float
+    success: bool
+    nbytes: int = 0
+    error: Optional[str] = None
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parses a mix string like ``ping=1,get_album=3`` into endpoint weights.
+
+    Args:
+        mix (str): Comma separated ``endpoint=weight`` pairs.
+
+    Returns:
+        dict: Endpoint names mapped to their weights.
+
+    Raises:
+        ValueError: If the string is malformed, names an unknown endpoint or
+            does not contain any positive weight.
+    """
+    weights: Dict[str, float] = {}
+    for part in mix.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown endpoint {name}!")
+        weights[name] = float(weight) if sep else 1.0
+        if weights[name] < 0:
+            raise ValueError(f"negative weight for {name}!")
+    if not any(weights.values()):
+        raise ValueError("mix needs at least one positive weight!")
+
+    return weights
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)) - 1, 0)
+
+    return values[min(rank, len(values) - 1)]
+
+
+def _subsonic(data: Any, key: str) -> Dict:
+    return data["subsonic-response"].get(key) or {}
+
+
+async def sample_library(
+    api: SonicAPI, size: int = 20, rng: Optional[random.Random] = None
+) -> Library:
+    """Samples artist, album and song IDs from the server.
+
+    Args:
+        api (SonicAPI): The API object to sample with.
+        size (int, optional): Maximum number of artists and albums to look at.
+            Defaults to 20.
+        rng (random.Random, optional): Random generator to sample with.
+
+    Returns:
+        Library: The sampled IDs.
+    """
+    rng = rng or random.Random()
+    library = Library()
+
+    artists = await api.get_artists()
+    library.artist_ids = [
+        str(artist["id"])
+        for index in _subsonic(artists, "artists").get("index", [])
+        for artist in index.get("artist", [])
+    ]
+    picked = rng.sample(library.artist_ids, min(size, len(library.artist_ids)))
+
+    for artist_id in picked:
+        artist = await api.get_artist(artist_id)
+        library.album_ids.extend(
+            str(album["id"]) for album in _subsonic(artist, "artist").get("album", [])
+        )
+    picked = rng.sample(library.album_ids, min(size, len(library.album_ids)))
+
+    for album_id in picked:
+        album = await api.get_album(album_id)
+        for song in _subsonic(album, "album").get("song", []):
+            song_id = str(song["id"])
+            library.song_ids.append(song_id)
+            parent = str(song.get("parent", ""))
+            if parent and parent not in library.directory_ids:
+                library.directory_ids.append(parent)
+
+    LOGGER.info(
+        "sampled %d artists, %d albums, %d songs",
+        len(library.artist_ids),
+        len(library.album_ids),
+        len(library.song_ids),
+    )
+
+    return library
+
+
+async def _ping(api: SonicAPI, library: Library, rng: random.Random) -> None:
+    # pylint: disable=unused-argument
+    await api.ping()
+
+
+async def _browse(api: SonicAPI, library: Library, rng: random.Random) -> None:
+    calls: List[Callable[[], Awaitable]] = [
+        api.get_music_folders,
+        api.get_indexes,
+        api.get_artists,
+        api.get_genres,
+    ]
+    if library.directory_ids:
+        directory_id = rng.choice(library.directory_ids)
+        calls.append(lambda: api.get_music_directory(directory_id))
+
+    await rng.choice(calls)()
+
+
+async def _get_artist(api: SonicAPI, library: Library, rng: random.Random) -> None:
+    await api.get_artist(rng.choice(library.artist_ids))
+
+
+async def _get_album(api: SonicAPI, library: Library, rng: random.Random) -> None:
+    await api.get_album(rng.choice(library.album_ids))
+
+
+async def _get_song(api: SonicAPI, library: Library, rng: random.Random) -> None:
+    await api.get_song(rng.choice(library.song_ids))
+
+
+async def _download(api: SonicAPI, library: Library, rng: random.Random) -> None:
+    await api.download(rng.choice(library.song_ids), os.devnull)
+
+
+Operation = Callable[[SonicAPI, Library, random.Random], Awaitable[None]]
+
+OPERATIONS: Dict[str, Operation] = {
+    "ping": _ping,
+    "browse": _browse,
+    "get_artist": _get_artist,
+    "get_album": _get_album,
+    "get_song": _get_song,
+    "download": _download,
+}
+
+REQUIRES: Dict[str, str] = {
+    "get_artist": "artist_ids",
+    "get_album": "album_ids",
+    "get_song": "song_ids",
+    "download": "song_ids",
+}
+
+
+def _summary(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(sample.latency for sample in samples)
+    errors = sum(1 for sample in samples if not sample.success)
+    nbytes = sum(sample.nbytes for sample in samples)
+    latency: Dict[str, Optional[float]] = {
+        "min": latencies[0] if latencies else None,
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        "max": latencies[-1] if latencies else None,
+    }
+    for pct in PERCENTILES:
+        latency[f"p{pct}"] = percentile(latencies, pct)
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "bytes": nbytes,
+        "bytes_per_second": nbytes / elapsed if elapsed else 0.0,
+        "latency": latency,
+    }
+
+
+def build_report(
+    samples: List[Sample], elapsed: float, interval: float = 1.0
+) -> Dict[str, Any]:
+    """Aggregates samples into the JSON report.
+
+    Args:
+        samples (list): The collected samples.
+        elapsed (float): Wall clock duration of the run in seconds.
+        interval (float, optional): Width of the timeline buckets in seconds.
+            Defaults to 1.0.
+
+    Returns:
+        dict: Overall, per endpoint and per interval statistics.
+    """
+    report = _summary(samples, elapsed)
+    report["duration"] = elapsed
+
+    endpoints: Dict[str, List[Sample]] = {}
+    errors: Dict[str, int] = {}
+    buckets: Dict[int, List[Sample]] = {}
+    for sample in samples:
+        endpoints.setdefault(sample.endpoint, []).append(sample)
+        if sample.error:
+            errors[sample.error] = errors.get(sample.error, 0) + 1
+        buckets.setdefault(int(sample.started // interval), []).append(sample)
+
+    report["endpoints"] = {
+        name: _summary(endpoint_samples, elapsed)
+        for name, endpoint_samples in sorted(endpoints.items())
+    }
+    report["error_types"] = errors
+    report["timeline"] = []
+    for bucket in range(int(elapsed // interval) + 1):
+        entry = _summary(buckets.get(bucket, []), interval)
+        entry["start"] = bucket * interval
+        report["timeline"].append(entry)
+
+    return report
+
+
+def _check_settings(
+    duration: float, concurrency: int, rate: Optional[float], interval: float
+) -> None:
+    if duration <= 0:
+        raise ValueError("duration has to be positive!")
+    if rate is not None and rate <= 0:
+        raise ValueError("rate has to be positive!")
+    if interval <= 0:
+        raise ValueError("interval has to be positive!")
+    if concurrency < 1:
+        raise ValueError("concurrency has to be at least 1!")
+
+
+async def run_bench(  # pylint: disable=too-many-arguments,too-many-locals
+    api: SonicAPI,
+    duration: float = 30.0,
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    mix: Optional[Dict[str, float]] = None,
+    sample_size: int = 20,
+    interval: float = 1.0,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Drives a mix of requests against the server and reports the results.
+
+    Without a ``rate`` a fixed number of ``concurrency`` workers send requests
+    back to back. With a ``rate`` requests are started on a fixed schedule and
+    ``concurrency`` only caps the requests in flight. Latency is then measured
+    from the scheduled start, so a saturated server shows up as latency instead
+    of silently lowering the offered load.
+
+    Args:
+        api (SonicAPI): The API object to drive.
+        duration (float, optional): How long to send requests in seconds.
+            Defaults to 30.
+        concurrency (int, optional): Number of workers or maximum requests in
+            flight. Defaults to 10.
+        rate (float, optional): Target requests per second.
+        mix (dict, optional): Endpoint names mapped to relative weights.
+            Defaults to ``DEFAULT_MIX``.
+        sample_size (int, optional): Number of artists and albums to sample IDs
+            from. Defaults to 20.
+        interval (float, optional): Width of the timeline buckets in seconds.
+            Defaults to 1.
+        seed (int, optional): Seed for endpoint and ID selection.
+
+    Returns:
+        dict: The report built by ``build_report``, plus the event loop lag seen
+        during the run and the ``decode_stats`` of ``api``.
+
+    Raises:
+        ValueError: If ``duration``, ``rate`` or ``interval`` is not positive,
+            ``concurrency`` is below 1 or no endpoint of the mix can be
+            requested.
+    """
+    _check_settings(duration, concurrency, rate, interval)
+    rng = random.Random(seed)
+    library = await sample_library(api, size=sample_size, rng=rng)
+
+    weights = {
+        name: weight
+        for name, weight in (mix or DEFAULT_MIX).items()
+        if weight > 0 and getattr(library, REQUIRES.get(name, ""), True)
+    }
+    for name in set(mix or DEFAULT_MIX) - set(weights):
+        LOGGER.warning("skipping %s, nothing to request", name)
+    if not weights:
+        raise ValueError("no endpoint in the mix can be requested!")
+    names = list(weights)
+    cum_weights = [sum(list(weights.values())[: i + 1]) for i in range(len(names))]
+
+    samples: List[Sample] = []
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.monotonic()
+    deadline = start + duration
+
+    async def _one(scheduled: float) -> None:
+        name = rng.choices(names, cum_weights=cum_weights)[0]
+        sample = Sample(name, scheduled - start, 0.0, True)
+        with api.count_bytes() as counter:
+            try:
+                await OPERATIONS[name](api, library, rng)
+            except Exception as error:  # pylint: disable=broad-except
+                sample.success = False
+                sample.error = type(error).__name__
+                LOGGER.debug("%s failed: %r", name, error)
+        sample.nbytes = counter.nbytes
+        sample.latency = time.monotonic() - scheduled
+        samples.append(sample)
+
+    async def _worker() -> None:
+        while time.monotonic() < deadline:
+            await _one(time.monotonic())
+
+    if rate:
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = []
+
+        async def _limited(scheduled: float) -> None:
+            async with semaphore:
+                await _one(scheduled)
+
+        scheduled = start
+        while scheduled < deadline:
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(_limited(scheduled)))
+            scheduled += 1 / rate
+        await asyncio.gather(*tasks)
+    else:
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+
+    report = build_report(samples, time.monotonic() - start, interval=interval)
+    await monitor.stop()
+    report["event_loop"] = {
+        "max_lag": monitor.max_lag,
+        "total_lag": monitor.total_lag,
+        "decode": asdict(api.decode_stats),
+    }
+    report["config"] = {
+        "server": api.server,
+        "duration": duration,
+        "concurrency": concurrency,
+        "rate": rate,
+        "mix": weights,
+        "sample_size": sample_size,
+        "seed": seed,
+    }
+
+    return report
@@ -1,9 +1,169 @@
 """Console script for aiosonic"""
+import asyncio
+import json
+import logging
+import os
+
 import click
 
+from aiosonic.bench import parse_mix, run_bench
+from aiosonic.proxy import run_proxy
+from aiosonic.sonic_api import SonicAPI
+
+
+def _mix_option(ctx, param, value):  # pylint: disable=unused-argument
+    if value is None:
+        return None
+    try:
+        return parse_mix(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+
+def _positive_option(ctx, param, value):  # pylint: disable=unused-argument
+    # click 7 ranges can not exclude their bounds
+    if value is not None and value <= 0:
+        raise click.BadParameter("has to be positive")
+    return value
 
-@click.command()
+
+@click.group()
 def main():
     """A API wrapper for subsonic"""
-    click.echo(("Replace this message by putting your code into " "aiosonic.cli.main"))
-    click.echo("See click documentation at http://click.pocoo.org/")
+
+
+@main.command()
+@click.option("--server", envvar="SUBSONIC_SERVER", required=True)
+@click.option("--username", envvar="SUBSONIC_USERNAME", required=True)
+@click.option("--password", envvar="SUBSONIC_PASSWORD", required=True)
+@click.option(
+    "--duration",
+    default=30.0,
+    show_default=True,
+    type=float,
+    callback=_positive_option,
+    help="Seconds to run.",
+)
+@click.option(
+    "--concurrency",
+    default=10,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Workers, or maximum requests in flight with --rate.",
+)
+@click.option(
+    "--rate",
+    type=float,
+    callback=_positive_option,
+    help="Target requests per second.",
+)
+@click.option(
+    "--mix",
+    callback=_mix_option,
+    help="Endpoint weights, e.g. ping=1,browse=2,get_album=3,download=1.",
+)
+@click.option(
+    "--sample-size",
+    default=20,
+    show_default=True,
+    help="Artists and albums to sample IDs from.",
+)
+@click.option(
+    "--interval",
+    default=1.0,
+    show_default=True,
+    type=float,
+    callback=_positive_option,
+    help="Timeline bucket seconds.",
+)
+@click.option("--seed", type=int, help="Seed for endpoint and ID selection.")
+@click.option("--output", type=click.File("w"), default="-", help="Report file.")
+def bench(  # pylint: disable=too-many-arguments
+    server,
+    username,
+    password,
+    duration,
+    concurrency,
+    rate,
+    mix,
+    sample_size,
+    interval,
+    seed,
+    output,
+):
+    """Load tests a subsonic server and writes a JSON report."""
+    api = SonicAPI(server, username, password)
+    report = asyncio.run(
+        run_bench(
+            api,
+            duration=duration,
+            concurrency=concurrency,
+            rate=rate,
+            mix=mix,
+            sample_size=sample_size,
+            interval=interval,
+            seed=seed,
+        )
+    )
+    json.dump(report, output, indent=2)
+    output.write("\n")
+
+
+@main.command()
+@click.option("--server", envvar="SUBSONIC_SERVER", required=True)
+@click.option("--username", envvar="SUBSONIC_USERNAME", required=True)
+@click.option("--password", envvar="SUBSONIC_PASSWORD", required=True)
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=4040, show_default=True)
+@click.option(
+    "--cache-dir",
+    default=os.path.join(click.get_app_dir("aiosonic"), "cache"),
+    show_default=True,
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    "--cache-size", default=1024, show_default=True, help="Cache size in MiB."
+)
+@click.option(
+    "--metadata-ttl",
+    default=300.0,
+    show_default=True,
+    help="Seconds to cache metadata responses.",
+)
+@click.option(
+    "--connections",
+    default=10,
+    show_default=True,
+    type=click.IntRange(min=3),
+    help="Upstream connections.",
+)
+@click.option("--local-username", help="Username local clients have to use.")
+@click.option("--local-password", help="Password local clients have to use.")
+@click.option("--debug", is_flag=True)
+def serve(  # pylint: disable=too-many-arguments
+    server,
+    username,
+    password,
+    host,
+    port,
+    cache_dir,
+    cache_size,
+    metadata_ttl,
+    connections,
+    local_username,
+    local_password,
+    debug,
+):
+    """Runs a caching subsonic proxy in front of a server."""
+    logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
+    run_proxy(
+        SonicAPI(server, username, password),
+        cache_dir,
+        cache_size * 1024 * 1024,
+        host=host,
+        port=port,
+        metadata_ttl=metadata_ttl,
+        connections=connections,
+        local_username=local_username,
+        local_password=local_password,
+    )
@@ -0,0 +1,133 @@
+"""HTTP Live Streaming playlists."""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from aiosonic.errors import APIError
+
+ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+@dataclass
+class Variant:
+    """A stream of a master playlist."""
+
+    uri: str
+    bandwidth: int
+    resolution: Optional[str] = None
+
+
+@dataclass
+class Segment:
+    """A media segment of a media playlist."""
+
+    uri: str
+    duration: float
+    sequence: int
+
+
+@dataclass
+class Playlist:
+    """A parsed m3u8 playlist.
+
+    A master playlist only has ``variants``, a media playlist only ``segments``.
+    """
+
+    variants: List[Variant] = field(default_factory=list)
+    segments: List[Segment] = field(default_factory=list)
+    target_duration: Optional[float] = None
+    media_sequence: int = 0
+    ended: bool = False
+
+    @property
+    def is_master(self) -> bool:
+        """If the playlist lists variants instead of segments."""
+        return bool(self.variants)
+
+
+def _attributes(value: str) -> Dict[str, str]:
+    return {key: val.strip('"') for key, val in ATTRIBUTE_RE.findall(value)}
+
+
+def parse_playlist(text: str, base_url: str = "") -> Playlist:
+    """Parses a m3u8 playlist.
+
+    Args:
+        text (str): The playlist.
+        base_url (str, optional): URL of the playlist, relative URIs are
+            resolved against it.
+
+    Returns:
+        Playlist: The variants or segments of the playlist.
+
+    Raises:
+        APIError: If the text is not a m3u8 playlist.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise APIError("not a m3u8 playlist!")
+
+    playlist = Playlist()
+    stream_inf: Optional[Dict[str, str]] = None
+    duration: Optional[float] = None
+    for line in lines[1:]:
+        tag, _, value = line.partition(":")
+        if tag == "#EXT-X-STREAM-INF":
+            stream_inf = _attributes(value)
+        elif tag == "#EXTINF":
+            duration = float(value.split(",", 1)[0])
+        elif tag == "#EXT-X-TARGETDURATION":
+            playlist.target_duration = float(value)
+        elif tag == "#EXT-X-MEDIA-SEQUENCE":
+            playlist.media_sequence = int(value)
+        elif tag == "#EXT-X-ENDLIST":
+            playlist.ended = True
+        elif line.startswith("#"):
+            continue
+        elif stream_inf is not None:
+            playlist.variants.append(
+                Variant(
+                    urljoin(base_url, line),
+                    int(stream_inf.get("BANDWIDTH", 0)),
+                    stream_inf.get("RESOLUTION"),
+                )
+            )
+            stream_inf = None
+        elif duration is not None:
+            playlist.segments.append(
+                Segment(
+                    urljoin(base_url, line),
+                    duration,
+                    playlist.media_sequence + len(playlist.segments),
+                )
+            )
+            duration = None
+
+    return playlist
+
+
+def select_variant(
+    variants: List[Variant], max_bandwidth: Optional[int] = None
+) -> Variant:
+    """Picks the variant with the highest bandwidth up to ``max_bandwidth``.
+
+    Args:
+        variants (list): Variants of a master playlist.
+        max_bandwidth (int, optional): Upper bound in bits per second. The best
+            variant is picked if None.
+
+    Returns:
+        Variant: The picked variant, or the lowest one if none fits.
+
+    Raises:
+        APIError: If there are no variants.
+    """
+    if not variants:
+        raise APIError("playlist has no variants!")
+    ordered = sorted(variants, key=lambda variant: variant.bandwidth)
+    if max_bandwidth is None:
+        return ordered[-1]
+    fitting = [variant for variant in ordered if variant.bandwidth <= max_bandwidth]
+
+    return fitting[-1] if fitting else ordered[0]
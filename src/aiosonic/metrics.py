@@ -0,0 +1,84 @@
+"""Event loop metrics."""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class DecodeStats:
+    """How response decoding used the event loop.
+
+    Responses below the decode threshold are decoded on the event loop, the
+    time that takes is time no other task can run. Larger responses are handed
+    to the executor and only counted.
+    """
+
+    inline: int = 0
+    offloaded: int = 0
+    blocking_seconds: float = 0.0
+    max_blocking_seconds: float = 0.0
+
+    def record_inline(self, seconds: float) -> None:
+        """Records a decode that blocked the event loop for ``seconds``."""
+        self.inline += 1
+        self.blocking_seconds += seconds
+        self.max_blocking_seconds = max(self.max_blocking_seconds, seconds)
+
+    def record_offloaded(self) -> None:
+        """Records a decode that ran in the executor."""
+        self.offloaded += 1
+
+
+@dataclass
+class ByteCounter:
+    """Response body bytes received by the requests of a block."""
+
+    nbytes: int = 0
+
+
+@dataclass
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a sleeping task.
+
+    Any lag beyond ``interval`` is time the loop was blocked by something,
+    no matter which code blocked it.
+
+    Example::
+
+        monitor = LoopLagMonitor()
+        monitor.start()
+        ...
+        await monitor.stop()
+        print(monitor.max_lag)
+    """
+
+    interval: float = 0.05
+    samples: int = 0
+    total_lag: float = 0.0
+    max_lag: float = 0.0
+    _task: Optional[asyncio.Future] = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - started - self.interval, 0.0)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self) -> None:
+        """Starts measuring in a background task."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stops measuring."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
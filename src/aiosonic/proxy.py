@@ -0,0 +1,594 @@
+"""A caching Subsonic reverse proxy."""
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+from xml.sax.saxutils import quoteattr
+
+import aiofiles
+import aiohttp
+from aiohttp import web
+
+from aiosonic.errors import APIError
+from aiosonic.scheduler import Priority, PriorityScheduler
+from aiosonic.sonic_api import SonicAPI
+from aiosonic.types import QueryDict
+
+LOGGER = logging.getLogger("SonicProxy")
+
+CHUNK_SIZE = 64 * 1024
+
+AUTH_PARAMS = frozenset(("u", "p", "t", "s", "c", "v", "jwt"))
+
+METADATA_ENDPOINTS = frozenset(
+    (
+        "getLicense",
+        "getMusicFolders",
+        "getIndexes",
+        "getMusicDirectory",
+        "getGenres",
+        "getArtists",
+        "getArtist",
+        "getAlbum",
+        "getSong",
+        "getVideos",
+        "getVideoInfo",
+        "getArtistInfo",
+        "getArtistInfo2",
+        "getAlbumInfo",
+        "getAlbumInfo2",
+        "getSimilarSongs",
+        "getSimilarSongs2",
+        "getTopSongs",
+        "getAlbumList",
+        "getAlbumList2",
+        "getSongsByGenre",
+        "search2",
+        "search3",
+        "getLyrics",
+    )
+)
+
+MEDIA_ENDPOINTS = frozenset(("stream", "download", "getCoverArt", "getAvatar"))
+
+# only the format of error responses depends on these, not the media itself
+FORMAT_PARAMS = frozenset(("f", "callback"))
+
+ERROR_CONTENT_TYPES = ("application/json", "text/xml", "application/xml")
+
+CACHE_FILE_RE = re.compile(r"([0-9a-f]{64})(\.meta|\.part)?")
+
+FAILED_RE = re.compile(rb'"status"\s*:\s*"failed"|status="failed"')
+
+FILL_ERRORS = (APIError, aiohttp.ClientError, asyncio.TimeoutError, OSError)
+
+ERROR_WRONG_CREDENTIALS = 40
+ERROR_GENERIC = 0
+
+
+def cache_key(endpoint: str, query: QueryDict) -> str:
+    """Key of a response, independent of the order of the query arguments."""
+    canonical = urlencode(sorted(query.items()), doseq=True)
+
+    return hashlib.sha256(f"{endpoint}?{canonical}".encode("utf-8")).hexdigest()
+
+
+def media_key(endpoint: str, query: QueryDict) -> str:
+    """Key of a media response, shared by clients asking for any format."""
+    return cache_key(
+        endpoint, {key: val for key, val in query.items() if key not in FORMAT_PARAMS}
+    )
+
+
+def _is_failed(body: bytes) -> bool:
+    return FAILED_RE.search(body) is not None
+
+
+@dataclass
+class CacheEntry:
+    """A response stored on disk."""
+
+    path: str
+    size: int
+    content_type: str
+    stored_at: float
+
+
+@dataclass
+class DiskCache:
+    """Size bounded cache of response bodies on disk.
+
+    Every entry is a data file plus a ``.meta`` file with its content type and
+    age, so the cache survives restarts. When the entries exceed ``max_bytes``
+    the least recently used ones are evicted. Files that are still being
+    filled are not counted. Only files named after a cache key are managed,
+    anything else in ``directory`` is left alone.
+    """
+
+    directory: str
+    max_bytes: int
+    size: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        self._entries: "collections.OrderedDict[str, CacheEntry]" = (
+            collections.OrderedDict()
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        keys = set()
+        for name in os.listdir(self.directory):
+            match = CACHE_FILE_RE.fullmatch(name)
+            if match is None or not os.path.isfile(os.path.join(self.directory, name)):
+                continue
+            key, suffix = match.groups()
+            if suffix == ".part":
+                os.remove(os.path.join(self.directory, name))
+            else:
+                keys.add(key)
+
+        entries = []
+        for key in keys:
+            try:
+                with open(self.path(key) + ".meta", encoding="utf-8") as meta:
+                    entry = CacheEntry(**json.load(meta))
+            except (OSError, ValueError, TypeError):
+                self._remove_files(key)
+                continue
+            entry.path = self.path(key)
+            if os.path.isfile(entry.path):
+                entries.append((os.path.getatime(entry.path), key, entry))
+            else:
+                self._remove_files(key)
+        for _, key, entry in sorted(entries):
+            self._entries[key] = entry
+            self.size += entry.size
+        self._evict()
+
+    def _remove_files(self, key: str) -> None:
+        for path in (self.path(key), self.path(key) + ".meta"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self.size -= entry.size
+            self._remove_files(key)
+            LOGGER.debug("evicted %s (%d bytes)", key, entry.size)
+
+    def path(self, key: str) -> str:
+        """Path of the data file of a key."""
+        return os.path.join(self.directory, key)
+
+    def part_path(self, key: str) -> str:
+        """Path to fill the data file of a key at before it is added."""
+        return self.path(key) + ".part"
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[CacheEntry]:
+        """Returns the entry of a key and marks it as recently used.
+
+        Args:
+            key (str): The key.
+            max_age (float, optional): Entries older than this many seconds are
+                treated as missing.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry.stored_at > max_age:
+            return None
+        self._entries.move_to_end(key)
+
+        return entry
+
+    def add(self, key: str, content_type: str) -> Optional[CacheEntry]:
+        """Moves the filled part file of a key into the cache.
+
+        Returns:
+            CacheEntry: The new entry, or None if it is larger than the cache.
+        """
+        part_path = self.part_path(key)
+        size = os.path.getsize(part_path)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        if size > self.max_bytes:
+            os.remove(part_path)
+            self._remove_files(key)
+            return None
+
+        entry = CacheEntry(self.path(key), size, content_type, time.time())
+        os.replace(part_path, entry.path)
+        with open(entry.path + ".meta", "w", encoding="utf-8") as meta:
+            json.dump(asdict(entry), meta)
+        self._entries[key] = entry
+        self.size += size
+        self._evict()
+
+        return entry
+
+
+@dataclass
+class _Fill:  # pylint: disable=too-many-instance-attributes
+    """A media transfer from upstream into the cache that clients can tail."""
+
+    path: str
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    content_type: str = "application/octet-stream"
+    content_length: Optional[int] = None
+    size: int = 0
+    done: bool = False
+    error: Optional[BaseException] = None
+    task: Optional[asyncio.Future] = None
+
+    async def notify(self) -> None:
+        """Wakes up the clients waiting for more data."""
+        async with self.changed:
+            self.changed.notify_all()
+
+
+@dataclass
+class SonicProxy:  # pylint: disable=too-many-instance-attributes
+    """Serves the Subsonic REST API from a cache in front of an upstream server.
+
+    Metadata responses are cached for ``metadata_ttl`` seconds, media until
+    they get evicted. Concurrent requests for the same response share a single
+    upstream request, and media is passed on to all of them while it still
+    arrives. Other endpoints are forwarded without caching.
+
+    Requests are made upstream with the credentials of ``api``. If
+    ``local_username`` is set, clients have to authenticate with it and
+    ``local_password``, otherwise every client is let through. The same goes
+    for ``/stats``, which answers with the counters of ``stats`` as JSON.
+    """
+
+    api: SonicAPI
+    cache: DiskCache
+    metadata_ttl: float = 300.0
+    local_username: Optional[str] = None
+    local_password: Optional[str] = None
+    upstream_requests: int = 0
+
+    def __post_init__(self) -> None:
+        self._metadata: Dict[str, asyncio.Future] = {}
+        self._fills: Dict[str, _Fill] = {}
+
+    def _authorized(self, request: web.Request) -> bool:
+        if self.local_username is None:
+            return True
+        if request.query.get("u") != self.local_username:
+            return False
+        password = self.local_password or ""
+        if "t" in request.query and "s" in request.query:
+            expected = hashlib.md5(
+                (password + request.query["s"]).encode("utf-8")
+            ).hexdigest()
+            return request.query["t"] == expected
+        given = request.query.get("p", "")
+        if given.startswith("enc:"):
+            try:
+                given = bytes.fromhex(given[4:]).decode("utf-8")
+            except ValueError:
+                return False
+
+        return given == password
+
+    @staticmethod
+    def _error(query: QueryDict, code: int, message: str) -> web.Response:
+        if query.get("f") == ["json"]:
+            body = json.dumps(
+                {
+                    "subsonic-response": {
+                        "status": "failed",
+                        "version": "1.15.0",
+                        "error": {"code": code, "message": message},
+                    }
+                }
+            )
+            return web.Response(text=body, content_type="application/json")
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<subsonic-response xmlns="http://subsonic.org/restapi" '
+            f'status="failed" version="1.15.0">'
+            f"<error code={quoteattr(str(code))} message={quoteattr(message)}/>"
+            "</subsonic-response>"
+        )
+
+        return web.Response(text=body, content_type="text/xml")
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        """Answers a request to ``/rest/<endpoint>[.view]``."""
+        name = request.match_info["endpoint"]
+        if name.endswith(".view"):
+            name = name[: -len(".view")]
+        # HEAD is answered like GET, aiohttp leaves out the body
+        req_method = "GET" if request.method == "HEAD" else request.method
+        params = request.query.copy()
+        if req_method == "POST":
+            params.extend(await request.post())
+        query: QueryDict = {
+            key: [str(value) for value in params.getall(key)]
+            for key in params
+            if key not in AUTH_PARAMS
+        }
+        query.setdefault("f", ["xml"])
+
+        if req_method not in ("GET", "POST"):
+            return self._error(
+                query, ERROR_GENERIC, f"{request.method} not a known request method!"
+            )
+        if not self._authorized(request):
+            return self._error(
+                query, ERROR_WRONG_CREDENTIALS, "Wrong username or password."
+            )
+
+        try:
+            if name in MEDIA_ENDPOINTS:
+                return await self._media(request, name, query)
+            if name in METADATA_ENDPOINTS and query.get("type") != ["random"]:
+                # random album lists have to differ on every request
+                return await self._cached_metadata(name, query)
+            content_type, body = await self._upstream(
+                req_method, name, query, Priority.INTERACTIVE
+            )
+        except (APIError, aiohttp.ClientError, asyncio.TimeoutError) as error:
+            LOGGER.warning("upstream %s failed: %r", name, error)
+            return self._error(query, ERROR_GENERIC, str(error))
+
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    async def _upstream(
+        self, req_method: str, name: str, query: QueryDict, priority: Priority
+    ) -> Tuple[str, bytes]:
+        self.upstream_requests += 1
+        async with self.api.open_stream(
+            f"/{name}", extra_query=query, req_method=req_method, priority=priority
+        ) as resp:
+            body = await resp.read()
+
+            return resp.headers.get("Content-Type", "application/octet-stream"), body
+
+    async def _fetch_metadata(
+        self, key: str, name: str, query: QueryDict
+    ) -> Tuple[str, bytes]:
+        try:
+            content_type, body = await self._upstream(
+                "GET", name, query, Priority.INTERACTIVE
+            )
+            if not _is_failed(body):
+                async with aiofiles.open(self.cache.part_path(key), "wb") as part:
+                    await part.write(body)
+                self.cache.add(key, content_type)
+
+            return content_type, body
+        finally:
+            del self._metadata[key]
+
+    async def _cached_metadata(self, name: str, query: QueryDict) -> web.StreamResponse:
+        key = cache_key(name, query)
+        entry = self.cache.get(key, max_age=self.metadata_ttl)
+        if entry is not None:
+            return web.FileResponse(
+                entry.path, headers={"Content-Type": entry.content_type}
+            )
+
+        if key not in self._metadata:
+            self._metadata[key] = asyncio.ensure_future(
+                self._fetch_metadata(key, name, query)
+            )
+        content_type, body = await asyncio.shield(self._metadata[key])
+
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    async def _fill(self, key: str, fill: _Fill, name: str, query: QueryDict) -> None:
+        try:
+            self.upstream_requests += 1
+            async with self.api.open_stream(
+                f"/{name}", extra_query=query, priority=Priority.NORMAL
+            ) as resp:
+                fill.content_type = resp.headers.get("Content-Type", fill.content_type)
+                if "Content-Encoding" not in resp.headers:
+                    fill.content_length = resp.content_length
+                async with aiofiles.open(fill.path, "wb") as part:
+                    fill.ready.set()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        await part.write(chunk)
+                        await part.flush()
+                        fill.size += len(chunk)
+                        await fill.notify()
+            if fill.content_type.split(";")[0] in ERROR_CONTENT_TYPES:
+                os.remove(fill.path)
+            else:
+                self.cache.add(key, fill.content_type)
+        except BaseException as error:  # pylint: disable=broad-except
+            # waiting clients have to learn about any failure, cancellation too
+            LOGGER.warning("filling %s failed: %r", key, error)
+            fill.error = error
+            if os.path.exists(fill.path):
+                os.remove(fill.path)
+            if not isinstance(error, FILL_ERRORS):
+                raise
+        finally:
+            fill.done = True
+            fill.ready.set()
+            del self._fills[key]
+            await fill.notify()
+
+    async def _media(
+        self, request: web.Request, name: str, query: QueryDict
+    ) -> web.StreamResponse:
+        if request.method == "HEAD":
+            return await self._media_head(name, query)
+
+        key = media_key(name, query)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return web.FileResponse(
+                entry.path, headers={"Content-Type": entry.content_type}
+            )
+
+        if key not in self._fills:
+            self._fills[key] = _Fill(self.cache.part_path(key))
+            self._fills[key].task = asyncio.ensure_future(
+                self._fill(key, self._fills[key], name, query)
+            )
+        fill = self._fills[key]
+        await fill.ready.wait()
+        if fill.error is not None:
+            raise APIError(f"fetching {name} failed: {fill.error}")
+
+        try:
+            part = await aiofiles.open(fill.path, "rb")
+        except FileNotFoundError as error:
+            # the fill completed and moved its file into the cache meanwhile
+            entry = self.cache.get(key)
+            if entry is None:
+                raise APIError(f"fetching {name} failed!") from error
+            return web.FileResponse(
+                entry.path, headers={"Content-Type": entry.content_type}
+            )
+
+        return await self._tail(request, name, fill, part)
+
+    @staticmethod
+    async def _tail(
+        request: web.Request, name: str, fill: _Fill, part: Any
+    ) -> web.StreamResponse:
+        # passes the part file on while the fill still writes to it
+        response = web.StreamResponse(headers={"Content-Type": fill.content_type})
+        if fill.content_length is not None:
+            response.content_length = fill.content_length
+        await response.prepare(request)
+        offset = 0
+        try:
+            while True:
+                async with fill.changed:
+                    await fill.changed.wait_for(lambda: fill.size > offset or fill.done)
+                chunk = await part.read(min(fill.size - offset, CHUNK_SIZE))
+                if not chunk:
+                    if fill.done and offset >= fill.size:
+                        break
+                    continue
+                offset += len(chunk)
+                await response.write(chunk)
+        finally:
+            await part.close()
+        if fill.error is not None:
+            LOGGER.warning("%s ended after %d bytes", name, offset)
+            if request.transport is not None:
+                request.transport.close()
+            return response
+        await response.write_eof()
+
+        return response
+
+    async def _media_head(self, name: str, query: QueryDict) -> web.Response:
+        # answered without filling the cache, the client does not want the body
+        entry = self.cache.get(media_key(name, query))
+        if entry is not None:
+            return web.Response(
+                headers={
+                    "Content-Type": entry.content_type,
+                    "Content-Length": str(entry.size),
+                }
+            )
+
+        self.upstream_requests += 1
+        async with self.api.open_stream(
+            f"/{name}", extra_query=query, priority=Priority.INTERACTIVE
+        ) as resp:
+            headers = {
+                header: resp.headers[header]
+                for header in ("Content-Type", "Content-Length")
+                if header in resp.headers
+            }
+
+        return web.Response(headers=headers)
+
+    async def close(self) -> None:
+        """Cancels the upstream requests still in progress."""
+        tasks = list(self._metadata.values()) + [
+            fill.task for fill in self._fills.values() if fill.task is not None
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Cache and upstream counters."""
+        return {
+            "upstream_requests": self.upstream_requests,
+            "cache_bytes": self.cache.size,
+            "scheduler": self.api.scheduler.stats(),
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """Answers a request to ``/stats``."""
+        if not self._authorized(request):
+            return web.json_response(
+                {"error": "Wrong username or password."}, status=401
+            )
+
+        return web.json_response(self.stats())
+
+
+def make_app(proxy: SonicProxy, connections: int = 10) -> web.Application:
+    """Creates the aiohttp application of a proxy.
+
+    The upstream requests of the proxy share one connection pool of at most
+    ``connections`` connections, created when the application starts.
+    """
+
+    async def _start(app: web.Application) -> None:  # pylint: disable=unused-argument
+        proxy.api.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=connections)
+        )
+
+    async def _stop(app: web.Application) -> None:  # pylint: disable=unused-argument
+        await proxy.close()
+        if proxy.api.session is not None:
+            await proxy.api.session.close()
+            proxy.api.session = None
+
+    app = web.Application()
+    app.router.add_route("*", "/rest/{endpoint}", proxy.handle)
+    app.router.add_get("/stats", proxy.handle_stats)
+    app.on_startup.append(_start)
+    app.on_cleanup.append(_stop)
+
+    return app
+
+
+def run_proxy(  # pylint: disable=too-many-arguments
+    api: SonicAPI,
+    cache_dir: str,
+    cache_size: int,
+    host: str = "127.0.0.1",
+    port: int = 4040,
+    metadata_ttl: float = 300.0,
+    connections: int = 10,
+    local_username: Optional[str] = None,
+    local_password: Optional[str] = None,
+) -> None:
+    """Runs a caching proxy until interrupted."""
+    api.scheduler = PriorityScheduler(capacity=connections)
+    proxy = SonicProxy(
+        api,
+        DiskCache(cache_dir, cache_size),
+        metadata_ttl=metadata_ttl,
+        local_username=local_username,
+        local_password=local_password,
+    )
+    web.run_app(make_app(proxy, connections=connections), host=host, port=port)
@@ -0,0 +1,175 @@
+"""Priority scheduling of requests."""
+import asyncio
+import collections
+import contextlib
+import enum
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+
+class Priority(enum.IntEnum):
+    """Priority classes of requests."""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BULK = 2
+
+
+DEFAULT_RESERVED: Dict[Priority, int] = {
+    Priority.INTERACTIVE: 2,
+    Priority.NORMAL: 0,
+    Priority.BULK: 1,
+}
+
+DEFAULT_WEIGHTS: Dict[Priority, float] = {
+    Priority.INTERACTIVE: 8.0,
+    Priority.NORMAL: 4.0,
+    Priority.BULK: 1.0,
+}
+
+
+@dataclass
+class ClassStats:
+    """Counters of one priority class."""
+
+    queued: int = 0
+    max_queued: int = 0
+    in_flight: int = 0
+    dispatched: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+@dataclass
+class PriorityScheduler:
+    """Shares a budget of concurrent requests between priority classes.
+
+    Each class may always use its ``reserved`` slots, the remaining slots of
+    ``capacity`` are shared. Without a ``capacity`` requests are never held
+    back and only counted. Whenever a slot frees up, waiting classes get it
+    by weighted fair queuing: over time a backlogged class receives shared
+    slots in proportion to its ``weights`` entry. Interactive requests
+    therefore overtake a queue of bulk requests, while bulk keeps its reserved
+    slot and a small share of the rest and never starves completely.
+
+    Args:
+        capacity (int, optional): Requests in flight over all classes. Has to
+            be at least the sum of ``reserved``, 3 with the defaults. Unbounded
+            if None, the default.
+        reserved (dict, optional): Slots reserved per class.
+        weights (dict, optional): Share of the shared slots per class.
+
+    Raises:
+        ValueError: If the reservations exceed the capacity.
+    """
+
+    capacity: Optional[int] = None
+    reserved: Dict[Priority, int] = field(
+        default_factory=lambda: dict(DEFAULT_RESERVED)
+    )
+    weights: Dict[Priority, float] = field(
+        default_factory=lambda: dict(DEFAULT_WEIGHTS)
+    )
+
+    def __post_init__(self) -> None:
+        if self.capacity is not None and sum(self.reserved.values()) > self.capacity:
+            raise ValueError("reserved slots exceed the capacity!")
+        self._queues: Dict[Priority, Deque[Tuple[asyncio.Future, float]]] = {
+            priority: collections.deque() for priority in Priority
+        }
+        self._stats = {priority: ClassStats() for priority in Priority}
+        self._tags = {priority: 0.0 for priority in Priority}
+        self._vtime = 0.0
+
+    def _shared_in_use(self) -> int:
+        return sum(
+            max(stats.in_flight - self.reserved.get(priority, 0), 0)
+            for priority, stats in self._stats.items()
+        )
+
+    def _can_run(self, priority: Priority) -> bool:
+        if self.capacity is None:
+            return True
+        if self._stats[priority].in_flight < self.reserved.get(priority, 0):
+            return True
+        shared = self.capacity - sum(self.reserved.values())
+
+        return self._shared_in_use() < shared
+
+    def _dispatch(self) -> None:
+        while True:
+            best: Optional[Priority] = None
+            best_tag = 0.0
+            for priority in Priority:
+                if not self._queues[priority] or not self._can_run(priority):
+                    continue
+                tag = self._tags[priority] + 1 / self.weights.get(priority, 1.0)
+                if best is None or tag < best_tag:
+                    best, best_tag = priority, tag
+            if best is None:
+                return
+
+            future, enqueued = self._queues[best].popleft()
+            stats = self._stats[best]
+            stats.queued -= 1
+            if future.done():
+                # cancelled, but its task did not get to clean up yet
+                continue
+            stats.in_flight += 1
+            stats.dispatched += 1
+            waited = time.monotonic() - enqueued
+            stats.wait_seconds += waited
+            stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+            self._vtime = self._tags[best]
+            self._tags[best] = best_tag
+            future.set_result(None)
+
+    async def acquire(self, priority: Priority) -> None:
+        """Waits for a slot of the given class."""
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        if not self._queues[priority]:
+            # a class that was idle starts at the current virtual time instead
+            # of claiming the share it did not use
+            self._tags[priority] = max(self._tags[priority], self._vtime)
+        self._queues[priority].append(entry)
+        stats = self._stats[priority]
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if entry in self._queues[priority]:
+                    self._queues[priority].remove(entry)
+                    stats.queued -= 1
+            else:
+                self.release(priority)
+            raise
+
+    def release(self, priority: Priority) -> None:
+        """Gives back a slot of the given class."""
+        self._stats[priority].in_flight -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        """Holds a slot of the given class for the duration of the block."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def queue_depth(self, priority: Priority) -> int:
+        """Number of requests of the class waiting for a slot."""
+        return self._stats[priority].queued
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Queue depth, requests in flight and wait times per class."""
+        return {
+            priority.name.lower(): dict(vars(self._stats[priority]))
+            for priority in Priority
+        }
@@ -1,28 +1,136 @@
 """The Sonic API Object."""
 import asyncio
+import collections
+import contextlib
+import contextvars
 import hashlib
 import logging
 import random
 import string
-from dataclasses import dataclass
-from typing import Dict, Optional, Tuple, Union
-from urllib.parse import urlencode, urlsplit, urlunsplit
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from json import loads
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
 import aiofiles
 import aiohttp
 
+from aiosonic.batch import BatchResult, fetch_batch, iter_batch
 from aiosonic.errors import APIError
-from aiosonic.types import APIReturn, QueryDict
+from aiosonic.hls import Playlist, parse_playlist, select_variant
+from aiosonic.metrics import ByteCounter, DecodeStats
+from aiosonic.scheduler import Priority, PriorityScheduler
+from aiosonic.throughput import TransferStats, select_quality
+from aiosonic.types import APIReturn, ItemID, QueryDict, Transform
+
+DECODE_THRESHOLD = 256 * 1024
+
+_PRIORITY: contextvars.ContextVar = contextvars.ContextVar(
+    "priority", default=Priority.NORMAL
+)
+
+_BYTE_COUNTER: contextvars.ContextVar = contextvars.ContextVar(
+    "byte_counter", default=None
+)
+
+
+def _decode_body(body: bytes, transform: Optional[Transform] = None) -> Any:
+    """Decodes a json response body and applies ``transform`` to it.
+
+    Module level, so it can be sent to a process pool.
+    """
+    data = loads(body)
+    if data["subsonic-response"]["status"] == "failed":
+        raise APIError(data["subsonic-response"]["error"]["message"])
+    if transform is not None:
+        return transform(data)
+
+    return data
 
 
 @dataclass
-class SonicAPI:
-    """A SonicAPI object."""
+class SonicAPI:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
+    """A SonicAPI object.
+
+    Json responses of at least ``decode_threshold`` bytes are decoded in
+    ``decode_executor`` (the default thread pool if None) instead of on the
+    event loop. ``decode_stats`` reports the time decoding blocked the loop.
+    The ``transform`` of an endpoint method runs there too; with a process
+    pool it has to be picklable, e.g. a module level function, not a lambda.
+
+    All requests share the slots of ``scheduler``, see ``priority`` for how to
+    run them as interactive or bulk traffic. The default scheduler does not
+    limit concurrency; pass ``PriorityScheduler(capacity=n)`` to cap requests
+    in flight at ``n``, e.g. to match the server's connection limit.
+
+    Requests go through ``session`` to reuse its connection pool, or through a
+    new session each if it is None.
+    """
 
     server: str
     username: str
     password: str
     logger: logging.Logger = logging.getLogger("SonicAPI")
+    transfer_stats: TransferStats = field(default_factory=TransferStats)
+    decode_threshold: int = DECODE_THRESHOLD
+    decode_executor: Optional[Executor] = None
+    decode_stats: DecodeStats = field(default_factory=DecodeStats)
+    scheduler: PriorityScheduler = field(default_factory=PriorityScheduler)
+    session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    @contextlib.contextmanager
+    def priority(priority: Priority) -> Iterator[None]:
+        """Runs all requests started in the block with the given priority.
+
+        The priority is kept in a context variable, so tasks created inside
+        the block inherit it.
+
+        Example::
+
+            with SonicAPI.priority(Priority.BULK):
+                await asyncio.gather(*(sonic.get_album(i) for i in album_ids))
+        """
+        token = _PRIORITY.set(priority)
+        try:
+            yield
+        finally:
+            _PRIORITY.reset(token)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def count_bytes() -> Iterator[ByteCounter]:
+        """Counts the response body bytes received by requests of the block.
+
+        Like ``priority`` the counter is kept in a context variable, so each
+        task counts only its own requests.
+
+        Example::
+
+            with SonicAPI.count_bytes() as counter:
+                await sonic.get_album(album_id)
+            print(counter.nbytes)
+        """
+        counter = ByteCounter()
+        token = _BYTE_COUNTER.set(counter)
+        try:
+            yield counter
+        finally:
+            _BYTE_COUNTER.reset(token)
 
     def _create_salt(self) -> str:
         """Creates random salt."""
@@ -51,19 +159,26 @@ class SonicAPI:
 
         return (salt, token)
 
-    async def _create_url(self, endpoint: str, extra_query: QueryDict = None) -> str:
+    async def _auth_query(self) -> QueryDict:
+        """Creates the authentication query arguments."""
         salt, token = await self._create_token()
-        query_dict: QueryDict = {
+
+        return {
             "u": self.username,
             "t": token,
             "s": salt,
             "c": "aiosonic",
             "v": "1.15.0",
-            "f": "json",
         }
+
+    async def _create_url(
+        self, endpoint: str, extra_query: Optional[QueryDict] = None
+    ) -> str:
+        query_dict = await self._auth_query()
+        query_dict["f"] = "json"
         if extra_query:
             query_dict.update(extra_query)
-        query = urlencode(query_dict)
+        query = urlencode(query_dict, doseq=True)
         scheme, netloc, path, _, fragment = urlsplit(self.server)
         if path and path[-1] == "/":
             path = path[:-1]
@@ -73,8 +188,46 @@ class SonicAPI:
 
         return url
 
-    async def _request(
-        self, req_method: str, endpoint: str, extra_query: QueryDict = None, json=True
+    async def _authenticate_url(self, url: str) -> str:
+        """Adds the authentication query to a URL of the server that lacks it.
+
+        Used for URLs the server hands out itself, e.g. HLS segments.
+        """
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        params = parse_qs(query)
+        if netloc != urlsplit(self.server).netloc or "u" in params or "jwt" in params:
+            return url
+        auth = urlencode(await self._auth_query())
+        query = f"{query}&{auth}" if query else auth
+
+        return urlunsplit((scheme, netloc, path, query, fragment))
+
+    async def _decode(
+        self, body: bytes, transform: Optional[Transform] = None
+    ) -> Any:
+        """Decodes a json body on the loop or in the executor, depending on size."""
+        if len(body) >= self.decode_threshold:
+            self.logger.debug("decoding %d bytes in executor", len(body))
+            self.decode_stats.record_offloaded()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.decode_executor, _decode_body, body, transform
+            )
+
+        started = time.monotonic()
+        try:
+            return _decode_body(body, transform)
+        finally:
+            self.decode_stats.record_inline(time.monotonic() - started)
+
+    async def _request(  # pylint: disable=too-many-arguments
+        self,
+        req_method: str,
+        endpoint: str,
+        extra_query: Optional[QueryDict] = None,
+        json=True,
+        transform: Optional[Transform] = None,
+        priority: Optional[Priority] = None,
     ) -> Union[Dict, bytes]:
         """Does requests against the Subsonic API.
 
@@ -88,6 +241,11 @@ class SonicAPI:
                 get encoded in the API url.
             json (bool, optional): If data should get decoded to a dict object.
                 Defaults to True.
+            transform (callable, optional): Post-processing of the decoded data,
+                e.g. building models. Runs together with the decoding, so large
+                responses get transformed in the executor too.
+            priority (Priority, optional): Scheduling class of the request.
+                Defaults to the class set with ``priority``, else NORMAL.
 
         Returns:
             Parsed json data dict or raw bytes.
@@ -101,27 +259,111 @@ class SonicAPI:
 
         url = await self._create_url(endpoint, extra_query=extra_query)
 
-        async with aiohttp.ClientSession() as session:
+        return await self._fetch(
+            req_method, url, json=json, transform=transform, priority=priority
+        )
+
+    @contextlib.asynccontextmanager
+    async def _session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """Yields the shared ``session`` or a new one for a single request."""
+        if self.session is not None:
+            yield self.session
+        else:
+            async with aiohttp.ClientSession() as session:
+                yield session
+
+    @contextlib.asynccontextmanager
+    async def _open(
+        self, req_method: str, url: str, priority: Optional[Priority] = None
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Opens a request and yields the response before its body is read.
+
+        The scheduler slot is held until the block is left, so the body can be
+        read incrementally, e.g. to pass it on while it still arrives.
+
+        Raises:
+            APIError: If the request method is unknown or the server does not
+                answer with status code 200.
+        """
+        if req_method not in ("GET", "POST"):
+            raise APIError(f"{req_method} not a known request method!")
+        if priority is None:
+            priority = _PRIORITY.get()
+
+        async with self.scheduler.slot(priority), self._session() as session:
 
             session_methods = {"GET": session.get, "POST": session.post}
 
+            started = time.monotonic()
             async with session_methods[req_method](url) as resp:
                 self.logger.debug("got response: %s", resp)
+                self.transfer_stats.record_latency(time.monotonic() - started)
+
+                if resp.status != 200:
+                    raise APIError(f"got status code {resp.status}!")
+
+                yield resp
+
+    @contextlib.asynccontextmanager
+    async def open_stream(
+        self,
+        endpoint: str,
+        extra_query: Optional[QueryDict] = None,
+        req_method: str = "GET",
+        priority: Optional[Priority] = None,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Opens a request and yields the response to read its body from.
+
+        Unlike the endpoint methods the body is not read up front, so it can
+        be passed on in chunks while it still arrives. The request keeps its
+        scheduler slot until the block is left.
+
+        Example::
 
-                if resp.status == 200:
-                    if json:
-                        data = await resp.json()
-                        self.logger.debug("got json: %s", data)
-                        if data["subsonic-response"]["status"] == "failed":
-                            raise APIError(
-                                data["subsonic-response"]["error"]["message"]
-                            )
-                        return data
+            async with sonic.open_stream("/stream", {"id": song_id}) as resp:
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    ...
 
-                    data = await resp.read()
-                    return data
+        Args:
+            endpoint (str): The Endpoint to connect to.
+            extra_query (QueryDict, optional): Extra query arguments that needs to
+                get encoded in the API url.
+            req_method (str, optional): The request method to use. Defaults to
+                GET.
+            priority (Priority, optional): Scheduling class of the request.
+                Defaults to the class set with ``priority``, else NORMAL.
+
+        Raises:
+            APIError: If the request method is unknown or the server does not
+                answer with status code 200.
+        """
+        url = await self._create_url(endpoint, extra_query=extra_query)
+        async with self._open(req_method, url, priority=priority) as resp:
+            yield resp
 
-                raise APIError(f"got status code {resp.status}!")
+    async def _fetch(  # pylint: disable=too-many-arguments
+        self,
+        req_method: str,
+        url: str,
+        json=True,
+        transform: Optional[Transform] = None,
+        priority: Optional[Priority] = None,
+    ) -> Union[Dict, bytes]:
+        """Does a request against a complete URL. See ``_request`` for arguments."""
+        async with self._open(req_method, url, priority=priority) as resp:
+            received = time.monotonic()
+            body = await resp.read()
+            self.transfer_stats.record_transfer(len(body), time.monotonic() - received)
+        counter = _BYTE_COUNTER.get()
+        if counter is not None:
+            counter.nbytes += len(body)
+
+        if json:
+            data = await self._decode(body, transform)
+            self.logger.debug("got json: %s", data)
+            return data
+
+        return body
 
     async def ping(self) -> APIReturn:
         """/ping
@@ -148,7 +390,8 @@ class SonicAPI:
         self,
         music_folder_id: Optional[int] = None,
         if_modified_since: Optional[int] = None,
-    ) -> APIReturn:
+        transform: Optional[Transform] = None,
+    ) -> Any:
         """/getIndexes
 
         Args:
@@ -157,25 +400,38 @@ class SonicAPI:
             if_modified_since (int, optional): If specified, only return a result if the
                 artist collection has changed since the given time (in milliseconds
                 since 1 Jan 1970)
+            transform (callable, optional): Builds models from the decoded
+                response. Runs with the decoding, in ``decode_executor`` for
+                large responses.
         """
         extra_query: QueryDict = {}
         extra_query["musicFolderId"] = music_folder_id
         extra_query["ifModifiedSince"] = if_modified_since
 
-        return await self._request("GET", "/getIndexes", extra_query=extra_query)
+        return await self._request(
+            "GET", "/getIndexes", extra_query=extra_query, transform=transform
+        )
 
-    async def get_music_directory(self, folder_id: int) -> APIReturn:
+    async def get_music_directory(
+        self, folder_id: ItemID, transform: Optional[Transform] = None
+    ) -> Any:
         """/getMusicDirectory
 
         Returns a listing of all files in a music directory. Typically used to get
         list of albums for an artist, or list of songs for an album.
 
         Args:
-            folder_id (int): A string which uniquely identifies the music folder.
+            folder_id (ItemID): A string which uniquely identifies the music folder.
                 Obtained by calls to getIndexes or getMusicDirectory.
+            transform (callable, optional): Builds models from the decoded
+                response. Runs with the decoding, in ``decode_executor`` for
+                large responses.
         """
         return await self._request(
-            "GET", "/getMusicDirectory", extra_query={"id": folder_id}
+            "GET",
+            "/getMusicDirectory",
+            extra_query={"id": folder_id},
+            transform=transform,
         )
 
     async def get_genres(self) -> APIReturn:
@@ -185,7 +441,11 @@ class SonicAPI:
         """
         return await self._request("GET", "/getGenres")
 
-    async def get_artists(self, music_folder_id: Optional[int] = None) -> APIReturn:
+    async def get_artists(
+        self,
+        music_folder_id: Optional[int] = None,
+        transform: Optional[Transform] = None,
+    ) -> Any:
         """/getArtists
 
         Similar to getIndexes, but organizes music according to ID3 tags.
@@ -193,6 +453,9 @@ class SonicAPI:
         Args:
            music_folder_id (int, optional): If specified, only return artists in the
                music folder with the given ID.
+           transform (callable, optional): Builds models from the decoded
+               response. Runs with the decoding, in ``decode_executor`` for
+               large responses.
 
         Returns:
             dict: Dictionary with Artists and its album count.
@@ -218,16 +481,23 @@ class SonicAPI:
         extra_query: QueryDict = {}
         extra_query["musicFolderId"] = music_folder_id
 
-        return await self._request("GET", "/getArtists", extra_query=extra_query)
+        return await self._request(
+            "GET", "/getArtists", extra_query=extra_query, transform=transform
+        )
 
-    async def get_artist(self, artist_id: int) -> APIReturn:
+    async def get_artist(
+        self, artist_id: ItemID, transform: Optional[Transform] = None
+    ) -> Any:
         """/getArtist
 
         Returns details for an artist, including a list of albums.
         This method organizes music according to ID3 tags.
 
         Args:
-            artist_id (int): The artist ID.
+            artist_id (ItemID): The artist ID.
+            transform (callable, optional): Builds models from the decoded
+                response. Runs with the decoding, in ``decode_executor`` for
+                large responses.
 
         Returns:
             dict: Dictionary with artist data.
@@ -256,16 +526,49 @@ class SonicAPI:
                 }
 
         """
-        return await self._request("GET", "/getArtist", extra_query={"id": artist_id})
+        return await self._request(
+            "GET", "/getArtist", extra_query={"id": artist_id}, transform=transform
+        )
+
+    async def get_artists_by_id(
+        self, artist_ids: Iterable[Hashable], concurrency: int = 10
+    ) -> List[BatchResult]:
+        """/getArtist for many artists
+
+        Fetches the artists with at most ``concurrency`` requests in flight.
+        Repeated IDs are only fetched once and a failing ID does not fail the
+        others.
+
+        Args:
+            artist_ids (iterable): The artist IDs.
+            concurrency (int, optional): Requests in flight at most.
+                Defaults to 10.
+
+        Returns:
+            list: A BatchResult per artist ID in the order of ``artist_ids``,
+            holding the ``get_artist`` data or the error.
+        """
+        return await fetch_batch(self.get_artist, artist_ids, concurrency=concurrency)
+
+    def iter_artists_by_id(
+        self, artist_ids: Iterable[Hashable], concurrency: int = 10
+    ) -> AsyncIterator[BatchResult]:
+        """Like ``get_artists_by_id``, but yields results as they complete."""
+        return iter_batch(self.get_artist, artist_ids, concurrency=concurrency)
 
-    async def get_album(self, album_id: int) -> APIReturn:
+    async def get_album(
+        self, album_id: ItemID, transform: Optional[Transform] = None
+    ) -> Any:
         """/getAlbum
 
         Returns details for an album, including a list of songs.
         This method organizes music according to ID3 tags.
 
         Args:
-            album_id (int): The album ID.
+            album_id (ItemID): The album ID.
+            transform (callable, optional): Builds models from the decoded
+                response. Runs with the decoding, in ``decode_executor`` for
+                large responses.
 
         Returns:
             dict: Album data.
@@ -315,15 +618,43 @@ class SonicAPI:
                 }
 
         """
-        return await self._request("GET", "/getAlbum", extra_query={"id": album_id})
+        return await self._request(
+            "GET", "/getAlbum", extra_query={"id": album_id}, transform=transform
+        )
+
+    async def get_albums(
+        self, album_ids: Iterable[Hashable], concurrency: int = 10
+    ) -> List[BatchResult]:
+        """/getAlbum for many albums
 
-    async def get_song(self, song_id: int) -> APIReturn:
+        Fetches the albums with at most ``concurrency`` requests in flight.
+        Repeated IDs are only fetched once and a failing ID does not fail the
+        others.
+
+        Args:
+            album_ids (iterable): The album IDs.
+            concurrency (int, optional): Requests in flight at most.
+                Defaults to 10.
+
+        Returns:
+            list: A BatchResult per album ID in the order of ``album_ids``,
+            holding the ``get_album`` data or the error.
+        """
+        return await fetch_batch(self.get_album, album_ids, concurrency=concurrency)
+
+    def iter_albums(
+        self, album_ids: Iterable[Hashable], concurrency: int = 10
+    ) -> AsyncIterator[BatchResult]:
+        """Like ``get_albums``, but yields results as they complete."""
+        return iter_batch(self.get_album, album_ids, concurrency=concurrency)
+
+    async def get_song(self, song_id: ItemID) -> APIReturn:
         """/getSong
 
         Returns details for a song.
 
         Args:
-            song_id (int): The song ID.
+            song_id (ItemID): The song ID.
 
         Returns:
             dict: Details for a song.
@@ -361,11 +692,42 @@ class SonicAPI:
         """
         return await self._request("GET", "/getSong", extra_query={"id": song_id})
 
-    async def get_videos(self) -> APIReturn:
+    async def get_songs(
+        self, song_ids: Iterable[Hashable], concurrency: int = 10
+    ) -> List[BatchResult]:
+        """/getSong for many songs
+
+        Fetches the songs with at most ``concurrency`` requests in flight.
+        Repeated IDs are only fetched once and a failing ID does not fail the
+        others.
+
+        Args:
+            song_ids (iterable): The song IDs.
+            concurrency (int, optional): Requests in flight at most.
+                Defaults to 10.
+
+        Returns:
+            list: A BatchResult per song ID in the order of ``song_ids``,
+            holding the ``get_song`` data or the error.
+        """
+        return await fetch_batch(self.get_song, song_ids, concurrency=concurrency)
+
+    def iter_songs(
+        self, song_ids: Iterable[Hashable], concurrency: int = 10
+    ) -> AsyncIterator[BatchResult]:
+        """Like ``get_songs``, but yields results as they complete."""
+        return iter_batch(self.get_song, song_ids, concurrency=concurrency)
+
+    async def get_videos(self, transform: Optional[Transform] = None) -> Any:
         """/getVideos
 
         Returns all video files.
 
+        Args:
+            transform (callable, optional): Builds models from the decoded
+                response. Runs with the decoding, in ``decode_executor`` for
+                large responses.
+
         Returns:
             list: Videos with details.
 
@@ -396,16 +758,16 @@ class SonicAPI:
                 ]
 
         """
-        return await self._request("GET", "/getVideos")
+        return await self._request("GET", "/getVideos", transform=transform)
 
-    async def get_video_info(self, video_id: int) -> APIReturn:
+    async def get_video_info(self, video_id: ItemID) -> APIReturn:
         """/getVideoInfo
 
         Returns details for a video, including information about available
         audio tracks, subtitles (captions) and conversions.
 
         Args:
-           video_id (int): The video ID.
+           video_id (ItemID): The video ID.
 
         Returns:
             dict: Video details. Still needs more dict details cause its not
@@ -417,13 +779,136 @@ class SonicAPI:
 
         return result
 
-    async def download(self, file_id: int, destination: str) -> None:
+    async def get_hls_playlist(
+        self,
+        video_id: ItemID,
+        bit_rates: Optional[List[Union[int, str]]] = None,
+        audio_track: Optional[int] = None,
+    ) -> Playlist:
+        """/hls.m3u8
+
+        Creates an HLS (HTTP Live Streaming) playlist used for streaming video
+        or audio.
+
+        Args:
+            video_id (ItemID): The video ID.
+            bit_rates (list, optional): Bitrates in kbps, optionally with a
+                resolution like ``"1000@480x360"``. With more than one the
+                server returns a master playlist with a variant per bitrate.
+            audio_track (int, optional): The ID of the audio track to use.
+
+        Returns:
+            Playlist: The parsed playlist, its URIs resolved to full URLs.
+        """
+        extra_query: QueryDict = {"id": video_id}
+        if bit_rates:
+            extra_query["bitRate"] = [str(bit_rate) for bit_rate in bit_rates]
+        if audio_track is not None:
+            extra_query["audioTrack"] = audio_track
+        url = await self._create_url("/hls.m3u8", extra_query=extra_query)
+
+        return await self._fetch_playlist(url, url)
+
+    async def _fetch_playlist(self, url: str, base_url: str) -> Playlist:
+        """Fetches a m3u8 playlist and resolves its URIs against ``base_url``.
+
+        Raises:
+            APIError: With the server's message if it answers with a failed
+                subsonic-response instead of a playlist.
+        """
+        body = await self._fetch("GET", url, json=False)
+        if body.lstrip().startswith(b"{"):  # type: ignore
+            _decode_body(body)  # type: ignore
+
+        return parse_playlist(body.decode("utf-8"), base_url=base_url)  # type: ignore
+
+    async def iter_hls_segments(  # pylint: disable=too-many-arguments,too-many-locals
+        self,
+        video_id: ItemID,
+        bit_rates: Optional[List[Union[int, str]]] = None,
+        max_bandwidth: Optional[int] = None,
+        prefetch: int = 3,
+        byte_budget: int = 32 * 1024 * 1024,
+    ) -> AsyncIterator[bytes]:
+        """Yields the media segments of a video in order.
+
+        The first segment is fetched on its own, so playback can start as soon
+        as it arrived. After that the next ``prefetch`` segments are fetched
+        concurrently while a segment is consumed, as long as the buffered
+        segments stay within ``byte_budget``. Segments still in flight count
+        with the mean segment size seen so far.
+
+        Args:
+            video_id (ItemID): The video ID.
+            bit_rates (list, optional): Bitrates to request, see
+                ``get_hls_playlist``.
+            max_bandwidth (int, optional): Upper bound in bits per second when
+                picking a variant of a master playlist. The best variant is
+                picked if None.
+            prefetch (int, optional): Segments fetched ahead. Defaults to 3.
+            byte_budget (int, optional): Bytes of fetched segments to buffer
+                at most. Defaults to 32 MiB.
+
+        Yields:
+            bytes: The segment data.
+        """
+        playlist = await self.get_hls_playlist(video_id, bit_rates=bit_rates)
+        if playlist.is_master:
+            variant = select_variant(playlist.variants, max_bandwidth)
+            self.logger.debug("selected variant %s", variant)
+            playlist = await self._fetch_playlist(
+                await self._authenticate_url(variant.uri), variant.uri
+            )
+
+        sizes: List[int] = []
+
+        async def _fetch_segment(uri: str) -> bytes:
+            data = await self._fetch(
+                "GET", await self._authenticate_url(uri), json=False
+            )
+            sizes.append(len(data))
+            return data  # type: ignore
+
+        def _fits() -> bool:
+            # segments still in flight count with the mean size seen so far,
+            # nothing is prefetched before the first size is known
+            if not sizes:
+                return False
+            mean = sum(sizes) / len(sizes)
+            buffered = sum(
+                len(task.result()) if task.done() and task.exception() is None else mean
+                for task in pending
+            )
+
+            return buffered + mean <= byte_budget
+
+        segments = collections.deque(playlist.segments)
+        pending: Deque[asyncio.Future] = collections.deque()
+
+        try:
+            while segments or pending:
+                if not pending:
+                    uri = segments.popleft().uri
+                    pending.append(asyncio.ensure_future(_fetch_segment(uri)))
+                segment = await pending.popleft()
+                # refill the window before handing the segment out, so the
+                # next ones arrive while it is consumed
+                while segments and len(pending) < prefetch and _fits():
+                    uri = segments.popleft().uri
+                    pending.append(asyncio.ensure_future(_fetch_segment(uri)))
+                yield segment
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def download(self, file_id: ItemID, destination: str) -> None:
         """/download
 
         Downloads file.
 
         Args:
-            file_id (int): Id of the file in the subsonic db.
+            file_id (ItemID): Id of the file in the subsonic db.
             destination (str): the local full path to download the file to.
         """
         file = await aiofiles.open(destination, mode="wb")
@@ -435,3 +920,70 @@ class SonicAPI:
         )
         await file.close()
         self.logger.info("done writing file")
+
+    async def select_stream_quality(self, song_id: ItemID) -> QueryDict:
+        """Chooses the stream quality of a song from measured transfers.
+
+        Looks up the song's ``bitRate`` and ``transcodedSuffix`` and picks
+        ``maxBitRate`` and ``format`` that fit the throughput and latency
+        measured from earlier transfers of this object.
+
+        Args:
+            song_id (ItemID): The song ID.
+
+        Returns:
+            QueryDict: Extra query arguments for ``/stream``.
+        """
+        data = await self.get_song(song_id)
+        song = data["subsonic-response"]["song"]  # type: ignore
+        query = select_quality(song, self.transfer_stats)
+        self.logger.debug(
+            "selected %s for song %s (throughput %s B/s, latency %s s)",
+            query,
+            song_id,
+            self.transfer_stats.throughput,
+            self.transfer_stats.latency,
+        )
+
+        return query
+
+    async def stream(
+        self,
+        song_id: ItemID,
+        max_bit_rate: Optional[int] = None,
+        stream_format: Optional[str] = None,
+        adaptive: bool = False,
+    ) -> APIReturn:
+        """/stream
+
+        Streams a given media file.
+
+        In adaptive mode ``max_bit_rate`` and ``stream_format`` are chosen by
+        ``select_stream_quality`` before the transfer starts. The quality only
+        changes from one song to the next, never within a song.
+
+        Args:
+            song_id (ItemID): A string which uniquely identifies the file to stream.
+            max_bit_rate (int, optional): If specified, the server will attempt
+                to limit the bitrate to this value, in kilobits per second.
+            stream_format (str, optional): Specifies the preferred target format
+                (e.g., "mp3" or "flv") in case there are multiple applicable
+                transcodings.
+            adaptive (bool, optional): Choose the quality from measured
+                transfers. Defaults to False.
+
+        Returns:
+            bytes: The media data.
+        """
+        extra_query: QueryDict = {"id": song_id}
+        if adaptive:
+            extra_query.update(await self.select_stream_quality(song_id))
+        else:
+            if max_bit_rate is not None:
+                extra_query["maxBitRate"] = max_bit_rate
+            if stream_format is not None:
+                extra_query["format"] = stream_format
+
+        return await self._request(
+            "GET", "/stream", extra_query=extra_query, json=False
+        )
@@ -0,0 +1,86 @@
+"""Transfer measurements and adaptive stream quality."""
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from aiosonic.types import QueryDict
+
+BIT_RATES = (32, 48, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+
+MIN_TRANSFER_BYTES = 64 * 1024
+
+
+@dataclass
+class TransferStats:
+    """Smoothed throughput and latency measurements of one server.
+
+    Both values are exponentially weighted moving averages, so recent transfers
+    count more than old ones. Transfers smaller than ``min_bytes`` only update
+    the latency, they are over before TCP gets up to speed and would make the
+    link look slower than it is.
+    """
+
+    alpha: float = 0.3
+    min_bytes: int = MIN_TRANSFER_BYTES
+    throughput: Optional[float] = None
+    latency: Optional[float] = None
+
+    def _smooth(self, old: Optional[float], new: float) -> float:
+        if old is None:
+            return new
+
+        return self.alpha * new + (1 - self.alpha) * old
+
+    def record_latency(self, seconds: float) -> None:
+        """Records the time until the response headers arrived."""
+        self.latency = self._smooth(self.latency, seconds)
+
+    def record_transfer(self, nbytes: int, seconds: float) -> None:
+        """Records a body transfer of ``nbytes`` that took ``seconds``."""
+        if nbytes < self.min_bytes or seconds <= 0:
+            return
+        self.throughput = self._smooth(self.throughput, nbytes / seconds)
+
+
+def select_quality(
+    song: Dict,
+    stats: TransferStats,
+    headroom: float = 0.75,
+    default_bit_rate: int = 128,
+) -> QueryDict:
+    """Chooses ``maxBitRate`` and ``format`` for streaming a song.
+
+    The budget is the measured throughput minus ``headroom``. If the song has a
+    duration the expected latency is taken out of the time available to fetch
+    it. Songs whose ``bitRate`` fits the budget are streamed uncapped, all
+    others are capped to the highest bit rate in ``BIT_RATES`` that fits and
+    transcoded to the song's ``transcodedSuffix`` if the server announced one.
+
+    Args:
+        song (dict): Song details as returned by ``/getSong``.
+        stats (TransferStats): Measurements of the server.
+        headroom (float, optional): Share of the throughput to use.
+            Defaults to 0.75.
+        default_bit_rate (int, optional): Budget in kbps as long as nothing
+            was measured yet. Defaults to 128.
+
+    Returns:
+        QueryDict: Extra query arguments for ``/stream``.
+    """
+    if stats.throughput is None:
+        budget = float(default_bit_rate)
+    else:
+        budget = stats.throughput * 8 / 1000 * headroom
+        duration = song.get("duration")
+        if duration and stats.latency:
+            budget *= max(duration - stats.latency, 0) / duration
+
+    bit_rate = song.get("bitRate")
+    if bit_rate and bit_rate <= budget:
+        return {"maxBitRate": 0}
+
+    capped = max((rate for rate in BIT_RATES if rate <= budget), default=BIT_RATES[0])
+    query: QueryDict = {"maxBitRate": capped}
+    if song.get("transcodedSuffix"):
+        query["format"] = song["transcodedSuffix"]
+
+    return query
@@ -1,6 +1,10 @@
 """Types."""
-from typing import Dict, Union
+from typing import Any, Callable, Dict, List, Union
 
-QueryDict = Dict[str, Union[str, int, None]]
+ItemID = Union[int, str]
+
+QueryDict = Dict[str, Union[str, int, List[str], None]]
 
 APIReturn = Union[Dict, bytes]
+
+Transform = Callable[[Dict], Any]
@@ -0,0 +1,85 @@
+# pylint: disable=missing-docstring
+import asyncio
+
+import pytest
+
+from aiosonic.batch import fetch_batch, iter_batch
+from aiosonic.errors import APIError
+
+
+def _fetcher(calls, delays=None):
+    async def _fetch(item_id):
+        calls.append(item_id)
+        await asyncio.sleep((delays or {}).get(item_id, 0))
+        if item_id == "bad":
+            raise APIError("not found")
+        return {"id": item_id}
+
+    return _fetch
+
+
+@pytest.mark.asyncio
+async def test_fetch_batch():
+    calls = []
+
+    results = await fetch_batch(
+        _fetcher(calls, {"a": 0.02}), ["a", "b", "bad", "a"], concurrency=2
+    )
+
+    assert [result.item_id for result in results] == ["a", "b", "bad", "a"]
+    assert [result.success for result in results] == [True, True, False, True]
+    assert results[0].result == {"id": "a"}
+    assert results[0] is results[3]
+    assert str(results[2].error) == "not found"
+    assert sorted(calls) == ["a", "b", "bad"]
+
+
+@pytest.mark.asyncio
+async def test_iter_batch_completion_order():
+    calls = []
+
+    results = [
+        result.item_id
+        async for result in iter_batch(
+            _fetcher(calls, {"a": 0.05, "b": 0.0}), ["a", "b", "b"]
+        )
+    ]
+
+    assert results == ["b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_iter_batch_concurrency():
+    running = []
+    peak = []
+
+    async def _fetch(item_id):
+        running.append(item_id)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(item_id)
+        return item_id
+
+    results = [result async for result in iter_batch(_fetch, range(10), 3)]
+
+    assert len(results) == 10
+    assert max(peak) == 3
+
+
+@pytest.mark.asyncio
+async def test_iter_batch_early_exit():
+    cancelled = []
+
+    async def _fetch(item_id):
+        try:
+            await asyncio.sleep(item_id)
+        except asyncio.CancelledError:
+            cancelled.append(item_id)
+            raise
+        return item_id
+
+    results = iter_batch(_fetch, [0, 10, 10])
+    assert (await results.__anext__()).item_id == 0
+    await results.aclose()
+
+    assert cancelled == [10]
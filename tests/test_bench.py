@@ -0,0 +1,167 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import pytest
+from asynctest import CoroutineMock
+
+from aiosonic import bench, sonic_api
+from aiosonic.errors import APIError
+
+
+@pytest.fixture
+def sonic():
+    api = sonic_api.SonicAPI("server", "username", "password")
+    api.ping = CoroutineMock(return_value={"subsonic-response": {"status": "ok"}})
+    api.get_artists = CoroutineMock(
+        return_value={
+            "subsonic-response": {
+                "artists": {"index": [{"artist": [{"id": "1"}, {"id": "2"}]}]}
+            }
+        }
+    )
+    api.get_artist = CoroutineMock(
+        return_value={"subsonic-response": {"artist": {"album": [{"id": "10"}]}}}
+    )
+    api.get_album = CoroutineMock(
+        return_value={
+            "subsonic-response": {
+                "album": {"song": [{"id": "100", "parent": "50", "size": 2048}]}
+            }
+        }
+    )
+    api.get_song = CoroutineMock(side_effect=APIError("not found"))
+    api.download = CoroutineMock()
+    yield api
+
+
+@pytest.mark.parametrize(
+    "mix,expected",
+    [
+        ("ping=1,get_album=3", {"ping": 1.0, "get_album": 3.0}),
+        ("download", {"download": 1.0}),
+        (" ping=2 , ", {"ping": 2.0}),
+    ],
+)
+def test_parse_mix(mix, expected):
+    assert bench.parse_mix(mix) == expected
+
+
+@pytest.mark.parametrize("mix", ["foo=1", "ping=0", "ping=-1", ""])
+def test_parse_mix_invalid(mix):
+    with pytest.raises(ValueError):
+        bench.parse_mix(mix)
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+
+    assert bench.percentile(values, 50) == 50.0
+    assert bench.percentile(values, 99) == 99.0
+    assert bench.percentile(values, 100) == 100.0
+    assert bench.percentile([], 50) is None
+
+
+@pytest.mark.asyncio
+async def test_sample_library(sonic):
+    library = await bench.sample_library(sonic, size=5)
+
+    assert sorted(library.artist_ids) == ["1", "2"]
+    assert library.album_ids == ["10", "10"]
+    assert library.song_ids == ["100", "100"]
+    assert library.directory_ids == ["50"]
+
+
+@pytest.mark.asyncio
+async def test_sample_library_integer_ids(sonic):
+    sonic.get_artists.return_value = {
+        "subsonic-response": {"artists": {"index": [{"artist": [{"id": 1}]}]}}
+    }
+    sonic.get_artist.return_value = {
+        "subsonic-response": {"artist": {"album": [{"id": 10}]}}
+    }
+    sonic.get_album.return_value = {
+        "subsonic-response": {
+            "album": {"song": [{"id": 100, "parent": 9}, {"id": 101, "parent": 9}]}
+        }
+    }
+
+    library = await bench.sample_library(sonic, size=5)
+
+    assert library.artist_ids == ["1"]
+    assert library.song_ids == ["100", "101"]
+    assert library.directory_ids == ["9"]
+
+
+def test_build_report():
+    samples = [
+        bench.Sample("ping", 0.1, 0.01, True, 10),
+        bench.Sample("ping", 1.2, 0.03, True, 10),
+        bench.Sample("get_song", 1.5, 0.02, False, 0, "APIError"),
+    ]
+
+    report = bench.build_report(samples, 2.0, interval=1.0)
+
+    assert report["requests"] == 3
+    assert report["errors"] == 1
+    assert report["bytes"] == 20
+    assert report["throughput"] == 1.5
+    assert report["latency"]["max"] == 0.03
+    assert report["endpoints"]["get_song"]["error_rate"] == 1.0
+    assert report["error_types"] == {"APIError": 1}
+    assert [entry["requests"] for entry in report["timeline"]] == [1, 2, 0]
+
+
+@pytest.mark.asyncio
+async def test_run_bench(sonic):
+    report = await bench.run_bench(
+        sonic,
+        duration=0.05,
+        concurrency=2,
+        mix={"ping": 1, "get_song": 1, "download": 1},
+        seed=1,
+    )
+
+    assert report["requests"] > 0
+    assert set(report["endpoints"]) <= {"ping", "get_song", "download"}
+    assert report["endpoints"]["get_song"]["errors"] > 0
+    assert report["error_types"] == {
+        "APIError": report["endpoints"]["get_song"]["errors"]
+    }
+    assert report["config"]["concurrency"] == 2
+    assert report["event_loop"]["max_lag"] >= 0
+    assert "blocking_seconds" in report["event_loop"]["decode"]
+
+
+@pytest.mark.asyncio
+async def test_run_bench_rate(sonic):
+    report = await bench.run_bench(
+        sonic, duration=0.1, rate=50, mix={"ping": 1}, seed=1
+    )
+
+    assert 1 <= report["requests"] <= 6
+    assert report["errors"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"rate": -1},
+        {"rate": 0},
+        {"rate": 10, "concurrency": 0},
+        {"concurrency": 0},
+        {"interval": 0},
+        {"duration": 0},
+    ],
+)
+async def test_run_bench_invalid_numbers(sonic, kwargs):
+    with pytest.raises(ValueError):
+        await bench.run_bench(sonic, mix={"ping": 1}, **kwargs)
+
+    assert not sonic.get_artists.called
+
+
+@pytest.mark.asyncio
+async def test_run_bench_skips_missing_ids(sonic):
+    sonic.get_artists.return_value = {"subsonic-response": {"artists": {}}}
+
+    with pytest.raises(ValueError):
+        await bench.run_bench(sonic, duration=0.01, mix={"get_song": 1})
@@ -1 +1,93 @@
 # pylint: disable=missing-docstring,redefined-outer-name
+import json
+
+import pytest
+from asynctest import patch
+
+from aiosonic import cli
+
+
+@patch("aiosonic.cli.run_bench")
+def test_bench(mock_run_bench, runner):
+    mock_run_bench.return_value = {"requests": 1}
+
+    result = runner.invoke(
+        cli.main,
+        [
+            "bench",
+            "--server",
+            "http://localhost:4040",
+            "--username",
+            "user",
+            "--password",
+            "pass",
+            "--duration",
+            "5",
+            "--mix",
+            "ping=1,get_song=2",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert json.loads(result.output) == {"requests": 1}
+    _, kwargs = mock_run_bench.call_args
+    assert kwargs["duration"] == 5.0
+    assert kwargs["mix"] == {"ping": 1.0, "get_song": 2.0}
+
+
+def test_bench_invalid_mix(runner):
+    result = runner.invoke(
+        cli.main,
+        ["bench", "--server", "s", "--username", "u", "--password", "p", "--mix", "x"],
+    )
+
+    assert result.exit_code == 2
+    assert "unknown endpoint x" in result.output
+
+
+@pytest.mark.parametrize(
+    "option,value",
+    [
+        ("--rate", "-1"),
+        ("--rate", "0"),
+        ("--concurrency", "0"),
+        ("--interval", "0"),
+        ("--duration", "-5"),
+    ],
+)
+@patch("aiosonic.cli.run_bench")
+def test_bench_invalid_numbers(mock_run_bench, runner, option, value):
+    result = runner.invoke(
+        cli.main,
+        ["bench", "--server", "s", "--username", "u", "--password", "p", option, value],
+    )
+
+    assert result.exit_code == 2
+    assert not mock_run_bench.called
+
+
+@patch("aiosonic.cli.run_proxy")
+def test_serve(mock_run_proxy, runner, tmpdir):
+    result = runner.invoke(
+        cli.main,
+        [
+            "serve",
+            "--server",
+            "http://remote:4040",
+            "--username",
+            "user",
+            "--password",
+            "pass",
+            "--cache-dir",
+            tmpdir.strpath,
+            "--cache-size",
+            "10",
+        ],
+    )
+
+    assert result.exit_code == 0
+    args, kwargs = mock_run_proxy.call_args
+    assert args[0].server == "http://remote:4040"
+    assert args[1:] == (tmpdir.strpath, 10 * 1024 * 1024)
+    assert kwargs["port"] == 4040
+    assert kwargs["local_username"] is None
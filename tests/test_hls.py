@@ -0,0 +1,68 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from aiosonic.errors import APIError
+from aiosonic.hls import Variant, parse_playlist, select_variant
+
+MASTER = """#EXTM3U
+#EXT-X-VERSION:1
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=1000000,CODECS="avc1,mp4a"
+hls.m3u8?id=1&bitRate=1000
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=2000000,RESOLUTION=1280x720
+hls.m3u8?id=1&bitRate=2000
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:1
+#EXT-X-TARGETDURATION:10
+#EXT-X-MEDIA-SEQUENCE:5
+#EXTINF:10,
+stream/stream.ts?id=1&hls=true&timeOffset=0
+#EXTINF:4.5,
+http://other.tld/stream.ts?id=1&timeOffset=10
+#EXT-X-ENDLIST
+"""
+
+
+def test_parse_master():
+    playlist = parse_playlist(MASTER, base_url="http://foo.tld/rest/hls.m3u8?id=1")
+
+    assert playlist.is_master
+    assert playlist.variants == [
+        Variant("http://foo.tld/rest/hls.m3u8?id=1&bitRate=1000", 1000000),
+        Variant("http://foo.tld/rest/hls.m3u8?id=1&bitRate=2000", 2000000, "1280x720"),
+    ]
+
+
+def test_parse_media():
+    playlist = parse_playlist(MEDIA, base_url="http://foo.tld/rest/hls.m3u8?id=1")
+
+    assert not playlist.is_master
+    assert playlist.target_duration == 10
+    assert playlist.ended
+    assert [segment.uri for segment in playlist.segments] == [
+        "http://foo.tld/rest/stream/stream.ts?id=1&hls=true&timeOffset=0",
+        "http://other.tld/stream.ts?id=1&timeOffset=10",
+    ]
+    assert [segment.duration for segment in playlist.segments] == [10, 4.5]
+    assert [segment.sequence for segment in playlist.segments] == [5, 6]
+
+
+def test_parse_invalid():
+    with pytest.raises(APIError):
+        parse_playlist("<html></html>")
+
+
+@pytest.mark.parametrize(
+    "max_bandwidth,expected",
+    [(None, 3000), (2500, 2000), (2000, 2000), (500, 1000)],
+)
+def test_select_variant(max_bandwidth, expected):
+    variants = [Variant("b", 2000), Variant("a", 1000), Variant("c", 3000)]
+
+    assert select_variant(variants, max_bandwidth).bandwidth == expected
+
+
+def test_select_variant_empty():
+    with pytest.raises(APIError):
+        select_variant([])
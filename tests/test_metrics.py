@@ -0,0 +1,34 @@
+# pylint: disable=missing-docstring
+import asyncio
+import time
+
+import pytest
+
+from aiosonic.metrics import DecodeStats, LoopLagMonitor
+
+
+def test_decode_stats():
+    stats = DecodeStats()
+
+    stats.record_inline(0.2)
+    stats.record_inline(0.1)
+    stats.record_offloaded()
+
+    assert stats.inline == 2
+    assert stats.offloaded == 1
+    assert stats.blocking_seconds == pytest.approx(0.3)
+    assert stats.max_blocking_seconds == 0.2
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+
+    assert monitor.samples >= 2
+    assert monitor.max_lag >= 0.05
+    assert monitor.total_lag >= monitor.max_lag
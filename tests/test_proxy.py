@@ -0,0 +1,307 @@
+# pylint: disable=missing-docstring,protected-access,redefined-outer-name
+import asyncio
+import contextlib
+import hashlib
+import os
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from aiosonic.proxy import DiskCache, SonicProxy, cache_key, make_app, media_key
+from aiosonic.sonic_api import SonicAPI
+
+
+def _add(cache, key, data):
+    with open(cache.part_path(key), "wb") as part:
+        part.write(data)
+    return cache.add(key, "audio/mpeg")
+
+
+def test_cache_key():
+    assert cache_key("getAlbum", {"id": ["1"], "f": ["json"]}) == cache_key(
+        "getAlbum", {"f": ["json"], "id": ["1"]}
+    )
+    assert cache_key("getAlbum", {"id": ["1"]}) != cache_key("getAlbum", {"id": ["2"]})
+
+
+def test_media_key():
+    assert media_key("stream", {"id": ["1"]}) == media_key(
+        "stream", {"id": ["1"], "f": ["jsonp"], "callback": ["cb"]}
+    )
+    assert media_key("stream", {"id": ["1"]}) != media_key(
+        "stream", {"id": ["1"], "maxBitRate": ["128"]}
+    )
+
+
+def test_disk_cache_evicts_least_recently_used(tmpdir):
+    cache = DiskCache(tmpdir.strpath, 25)
+    _add(cache, "a", b"x" * 10)
+    _add(cache, "b", b"x" * 10)
+    cache.get("a")
+    _add(cache, "c", b"x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a").size == 10
+    assert cache.get("c").content_type == "audio/mpeg"
+    assert cache.size == 20
+    assert not os.path.exists(cache.path("b"))
+
+
+def test_disk_cache_too_large(tmpdir):
+    cache = DiskCache(tmpdir.strpath, 5)
+
+    assert _add(cache, "a", b"x" * 10) is None
+    assert os.listdir(tmpdir.strpath) == []
+
+
+def test_disk_cache_reload(tmpdir):
+    key, partial, orphan, directory = (
+        cache_key("stream", {"id": [str(i)]}) for i in range(4)
+    )
+    cache = DiskCache(tmpdir.strpath, 100)
+    _add(cache, key, b"x" * 10)
+    tmpdir.join(partial + ".part").write("partial")
+    tmpdir.join(orphan).write("orphan")
+    tmpdir.join("unrelated").write("unrelated")
+    tmpdir.mkdir(directory)
+
+    cache = DiskCache(tmpdir.strpath, 100)
+
+    assert cache.get(key).size == 10
+    assert cache.size == 10
+    assert sorted(os.listdir(tmpdir.strpath)) == sorted(
+        [key, key + ".meta", "unrelated", directory]
+    )
+
+
+def test_disk_cache_max_age(tmpdir):
+    cache = DiskCache(tmpdir.strpath, 100)
+    _add(cache, "a", b"x")
+    cache.get("a").stored_at -= 60
+
+    assert cache.get("a", max_age=30) is None
+    assert cache.get("a", max_age=90) is not None
+
+
+@pytest.fixture
+def upstream_calls():
+    yield []
+
+
+def _upstream_app(calls):
+    async def get_album(request):
+        calls.append(("getAlbum", dict(request.query)))
+        await asyncio.sleep(0.05)
+        if request.query["id"] == "404":
+            return web.json_response(
+                {
+                    "subsonic-response": {
+                        "status": "failed",
+                        "error": {"code": 70, "message": "not found"},
+                    }
+                }
+            )
+        return web.json_response(
+            {
+                "subsonic-response": {
+                    "status": "ok",
+                    "album": {"id": request.query["id"]},
+                }
+            }
+        )
+
+    async def get_album_list2(request):
+        calls.append(("getAlbumList2", dict(request.query)))
+        return web.json_response(
+            {"subsonic-response": {"status": "ok", "albumList2": {"album": []}}}
+        )
+
+    async def stream(request):
+        calls.append(("stream", dict(request.query)))
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        for _ in range(5):
+            await response.write(b"x" * 1000)
+            await asyncio.sleep(0.01)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/rest/getAlbum", get_album)
+    app.router.add_get("/rest/getAlbumList2", get_album_list2)
+    app.router.add_get("/rest/stream", stream)
+    return app
+
+
+@contextlib.asynccontextmanager
+async def _proxy_client(calls, tmpdir, **kwargs):
+    upstream = TestServer(_upstream_app(calls))
+    await upstream.start_server()
+    proxy = SonicProxy(
+        SonicAPI(str(upstream.make_url("/")), "username", "password"),
+        DiskCache(tmpdir.strpath, 1024 * 1024),
+        **kwargs,
+    )
+    client = TestClient(TestServer(make_app(proxy)))
+    await client.start_server()
+    try:
+        yield client, proxy
+    finally:
+        await client.close()
+        await upstream.close()
+
+
+@pytest.mark.asyncio
+async def test_proxy_metadata(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, proxy):
+        url = "/rest/getAlbum.view?id=1&u=client&t=token&s=salt&f=json"
+        responses = await asyncio.gather(*(client.get(url) for _ in range(3)))
+        bodies = [await response.json() for response in responses]
+        cached = await (await client.get(url)).json()
+
+    assert len(upstream_calls) == 1
+    assert upstream_calls[0][1]["u"] == "username"
+    assert upstream_calls[0][1]["f"] == "json"
+    assert all(body["subsonic-response"]["album"] == {"id": "1"} for body in bodies)
+    assert cached == bodies[0]
+    assert proxy.upstream_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_proxy_metadata_defaults_to_xml(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, _):
+        await client.get("/rest/getAlbum?id=1")
+
+    assert upstream_calls[0][1]["f"] == "xml"
+
+
+@pytest.mark.asyncio
+async def test_proxy_metadata_failed_not_cached(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, _):
+        for _ in range(2):
+            body = await (await client.get("/rest/getAlbum?id=404&f=json")).json()
+            assert body["subsonic-response"]["status"] == "failed"
+
+    assert len(upstream_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_proxy_request_methods(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, _):
+        head = await client.head("/rest/getAlbum?id=1&f=json")
+        put = await (await client.put("/rest/getAlbum?id=1&f=json")).json()
+        media = await client.head("/rest/stream?id=1")
+        await (await client.get("/rest/stream?id=1")).read()
+        cached = await client.head("/rest/stream?id=1")
+
+    assert head.status == 200
+    assert await head.read() == b""
+    assert put["subsonic-response"]["status"] == "failed"
+    assert media.status == 200
+    assert media.headers["Content-Type"] == "audio/mpeg"
+    assert await media.read() == b""
+    assert cached.headers["Content-Length"] == "5000"
+    assert [call[0] for call in upstream_calls] == ["getAlbum", "stream", "stream"]
+
+
+@pytest.mark.asyncio
+async def test_proxy_random_album_list_not_cached(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, _):
+        for _ in range(2):
+            await client.get("/rest/getAlbumList2?type=random&f=json")
+            await client.get("/rest/getAlbumList2?type=newest&f=json")
+
+    assert [call[1]["type"] for call in upstream_calls] == [
+        "random",
+        "newest",
+        "random",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_proxy_media(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, proxy):
+        url = "/rest/stream.view?id=1&maxBitRate=128"
+        responses = await asyncio.gather(*(client.get(url) for _ in range(3)))
+        bodies = [await response.read() for response in responses]
+        cached = await client.get(url)
+        cached_body = await cached.read()
+
+    assert len(upstream_calls) == 1
+    assert bodies == [b"x" * 5000] * 3
+    assert all(
+        response.headers["Content-Type"] == "audio/mpeg" for response in responses
+    )
+    assert cached_body == b"x" * 5000
+    assert cached.headers["Content-Type"] == "audio/mpeg"
+    assert proxy.cache.size == 5000
+
+
+@pytest.mark.asyncio
+async def test_proxy_media_shared_between_formats(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, _):
+        bodies = [
+            await (await client.get(f"/rest/stream?id=1{extra}")).read()
+            for extra in ("", "&f=json", "&f=jsonp&callback=cb")
+        ]
+
+    assert bodies == [b"x" * 5000] * 3
+    assert len(upstream_calls) == 1
+    assert upstream_calls[0][1]["f"] == "xml"
+
+
+@pytest.mark.asyncio
+async def test_proxy_close_cancels_fills(upstream_calls, tmpdir):
+    async with _proxy_client(upstream_calls, tmpdir) as (client, proxy):
+        request = asyncio.ensure_future(client.get("/rest/stream?id=1"))
+        while not proxy._fills:
+            await asyncio.sleep(0.01)
+        fill = next(iter(proxy._fills.values()))
+
+        await proxy.close()
+        await asyncio.gather(request, return_exceptions=True)
+
+    assert isinstance(fill.error, asyncio.CancelledError)
+    assert fill.done
+    assert not proxy._fills
+    assert os.listdir(tmpdir.strpath) == []
+
+
+@pytest.mark.asyncio
+async def test_proxy_media_upstream_error(tmpdir):
+    async with _proxy_client([], tmpdir) as (client, proxy):
+        body = await (await client.get("/rest/getCoverArt?id=1&f=json")).json()
+
+    assert body["subsonic-response"]["status"] == "failed"
+    assert proxy.cache.size == 0
+
+
+@pytest.mark.asyncio
+async def test_proxy_local_auth(upstream_calls, tmpdir):
+    async with _proxy_client(
+        upstream_calls, tmpdir, local_username="local", local_password="secret"
+    ) as (client, _):
+        wrong = await client.get("/rest/getAlbum?id=1&u=local&p=wrong")
+        token = hashlib.md5(b"secretsalt").hexdigest()
+        right = await client.get(f"/rest/getAlbum?id=1&u=local&t={token}&s=salt&f=json")
+        encoded = await client.get("/rest/getAlbum?id=1&u=local&p=enc:736563726574")
+
+        assert 'code="40"' in await wrong.text()
+        assert (await right.json())["subsonic-response"]["status"] == "ok"
+        assert "failed" not in await encoded.text()
+
+
+@pytest.mark.asyncio
+async def test_proxy_stats(upstream_calls, tmpdir):
+    async with _proxy_client(
+        upstream_calls, tmpdir, local_username="local", local_password="secret"
+    ) as (client, _):
+        await client.get("/rest/getAlbum?id=1&u=local&p=secret")
+        wrong = await client.get("/stats?u=local&p=wrong")
+        stats = await (await client.get("/stats?u=local&p=secret")).json()
+
+    assert wrong.status == 401
+    assert stats["upstream_requests"] == 1
+    assert stats["cache_bytes"] > 0
+    assert stats["scheduler"]["interactive"]["dispatched"] == 1
@@ -0,0 +1,148 @@
+# pylint: disable=missing-docstring
+import asyncio
+
+import pytest
+
+from aiosonic.scheduler import Priority, PriorityScheduler
+
+
+async def _run(scheduler, priority, order, hold):
+    async with scheduler.slot(priority):
+        order.append(priority)
+        await hold.wait()
+
+
+def test_reserved_exceeds_capacity():
+    with pytest.raises(ValueError):
+        PriorityScheduler(capacity=1, reserved={Priority.INTERACTIVE: 2})
+    with pytest.raises(ValueError):
+        PriorityScheduler(capacity=2)
+
+
+@pytest.mark.asyncio
+async def test_unbounded_by_default():
+    scheduler = PriorityScheduler()
+    for _ in range(20):
+        await scheduler.acquire(Priority.NORMAL)
+
+    assert scheduler.queue_depth(Priority.NORMAL) == 0
+    assert scheduler.stats()["normal"]["in_flight"] == 20
+
+
+@pytest.mark.asyncio
+async def test_capacity():
+    scheduler = PriorityScheduler(capacity=2, reserved={})
+    await scheduler.acquire(Priority.NORMAL)
+    await scheduler.acquire(Priority.NORMAL)
+    waiter = asyncio.ensure_future(scheduler.acquire(Priority.NORMAL))
+    await asyncio.sleep(0)
+
+    assert not waiter.done()
+    assert scheduler.queue_depth(Priority.NORMAL) == 1
+
+    scheduler.release(Priority.NORMAL)
+    await waiter
+
+    assert scheduler.queue_depth(Priority.NORMAL) == 0
+    assert scheduler.stats()["normal"]["in_flight"] == 2
+    assert scheduler.stats()["normal"]["max_queued"] == 1
+
+
+@pytest.mark.asyncio
+async def test_interactive_overtakes_bulk():
+    scheduler = PriorityScheduler(capacity=1, reserved={})
+    await scheduler.acquire(Priority.BULK)
+    order = []
+    hold = asyncio.Event()
+    hold.set()
+    tasks = [
+        asyncio.ensure_future(_run(scheduler, Priority.BULK, order, hold))
+        for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    tasks.append(
+        asyncio.ensure_future(_run(scheduler, Priority.INTERACTIVE, order, hold))
+    )
+    await asyncio.sleep(0)
+
+    scheduler.release(Priority.BULK)
+    await asyncio.gather(*tasks)
+
+    assert order[0] == Priority.INTERACTIVE
+
+
+@pytest.mark.asyncio
+async def test_weighted_fair_share():
+    scheduler = PriorityScheduler(capacity=1, reserved={})
+    await scheduler.acquire(Priority.NORMAL)
+    order = []
+    hold = asyncio.Event()
+    hold.set()
+    tasks = [
+        asyncio.ensure_future(_run(scheduler, priority, order, hold))
+        for _ in range(18)
+        for priority in (Priority.INTERACTIVE, Priority.BULK)
+    ]
+    await asyncio.sleep(0)
+
+    scheduler.release(Priority.NORMAL)
+    await asyncio.gather(*tasks)
+
+    assert order[:9].count(Priority.INTERACTIVE) == 8
+    assert order[:9].count(Priority.BULK) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_keeps_reserved_slot():
+    scheduler = PriorityScheduler(
+        capacity=2, reserved={Priority.INTERACTIVE: 0, Priority.BULK: 1}
+    )
+    order = []
+    hold = asyncio.Event()
+    tasks = [
+        asyncio.ensure_future(_run(scheduler, Priority.INTERACTIVE, order, hold))
+        for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(_run(scheduler, Priority.BULK, order, hold)))
+    await asyncio.sleep(0)
+
+    assert order == [Priority.INTERACTIVE, Priority.BULK]
+    assert scheduler.queue_depth(Priority.INTERACTIVE) == 4
+
+    hold.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_cancel_waiting():
+    scheduler = PriorityScheduler(capacity=1, reserved={})
+    await scheduler.acquire(Priority.NORMAL)
+    waiter = asyncio.ensure_future(scheduler.acquire(Priority.BULK))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert scheduler.queue_depth(Priority.BULK) == 0
+    scheduler.release(Priority.NORMAL)
+    assert scheduler.stats()["bulk"]["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancel_waiting_and_release():
+    scheduler = PriorityScheduler(capacity=1, reserved={})
+    await scheduler.acquire(Priority.NORMAL)
+    cancelled = asyncio.ensure_future(scheduler.acquire(Priority.NORMAL))
+    waiter = asyncio.ensure_future(scheduler.acquire(Priority.NORMAL))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    scheduler.release(Priority.NORMAL)
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    await waiter
+
+    assert scheduler.queue_depth(Priority.NORMAL) == 0
+    assert scheduler.stats()["normal"]["in_flight"] == 1
@@ -1,9 +1,12 @@
 # pylint: disable=missing-docstring,protected-access,redefined-outer-name
+import asyncio
+
 import pytest
-from asynctest import CoroutineMock, call, patch
+from asynctest import CoroutineMock, MagicMock, call, patch
 
 from aiosonic import sonic_api
 from aiosonic.errors import APIError
+from aiosonic.scheduler import Priority
 
 
 @pytest.fixture
@@ -81,13 +84,11 @@ async def test_create_url(mock_create_token, server, extra_query, expected):
 @patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
 async def test_request_exception(mock_get, mock_create_url, sonic):
     mock_create_url.return_value = "http://foo.bar.tld/endpoint"
-    mock_get.return_value.__aenter__.return_value.json = CoroutineMock(
-        return_value={
-            "subsonic-response": {
-                "status": "failed",
-                "error": {"message": "this is a test"},
-            }
-        }
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=(
+            b'{"subsonic-response": {"status": "failed",'
+            b' "error": {"message": "this is a test"}}}'
+        )
     )
     mock_get.return_value.__aenter__.return_value.status = 200
 
@@ -112,6 +113,22 @@ async def test_request_wrong_method(sonic):
         await sonic._request("FOO", "/endpoint")
 
 
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_open_stream(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/stream"
+    mock_get.return_value.__aenter__.return_value.status = 200
+
+    async with sonic.open_stream("/stream", {"id": 1}) as resp:
+        assert resp is mock_get.return_value.__aenter__.return_value
+
+    mock_create_url.assert_called_once_with("/stream", extra_query={"id": 1})
+    with pytest.raises(APIError):
+        async with sonic.open_stream("/stream", req_method="HEAD"):
+            pass
+
+
 @pytest.mark.asyncio
 @patch("aiosonic.sonic_api.SonicAPI._create_url")
 @patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
@@ -132,8 +149,8 @@ async def test_request_json_false(mock_get, mock_create_url, sonic):
 @patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
 async def test_request_json_true(mock_get, mock_create_url, sonic):
     mock_create_url.return_value = "http://foo.bar.tld/endpoint"
-    mock_get.return_value.__aenter__.return_value.json = CoroutineMock(
-        return_value={"subsonic-response": {"status": "ok", "foo": "bar"}}
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b'{"subsonic-response": {"status": "ok", "foo": "bar"}}'
     )
     mock_get.return_value.__aenter__.return_value.status = 200
 
@@ -150,3 +167,355 @@ async def test_download(mock_request, sonic, tmpdir):
     await sonic.download(123, download_file.strpath)
 
     assert download_file.read() == "foo bar"
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_request_records_transfer(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b"x" * 128 * 1024
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+
+    await sonic._request("GET", "/endpoint", json=False)
+
+    assert sonic.transfer_stats.latency is not None
+    assert sonic.transfer_stats.throughput > 0
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_count_bytes(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b"x" * 100
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+
+    with sonic.count_bytes() as counter:
+        await sonic._request("GET", "/endpoint", json=False)
+        await sonic._request("GET", "/endpoint", json=False)
+    await sonic._request("GET", "/endpoint", json=False)
+
+    assert counter.nbytes == 200
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._request")
+async def test_stream(mock_request, sonic):
+    mock_request.return_value = b"music"
+
+    result = await sonic.stream(123, max_bit_rate=128)
+
+    assert result == b"music"
+    mock_request.assert_called_once_with(
+        "GET", "/stream", extra_query={"id": 123, "maxBitRate": 128}, json=False
+    )
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._request")
+async def test_stream_adaptive(mock_request, sonic):
+    mock_request.side_effect = [
+        {
+            "subsonic-response": {
+                "status": "ok",
+                "song": {"id": "123", "bitRate": 997, "transcodedSuffix": "mp3"},
+            }
+        },
+        b"music",
+    ]
+    sonic.transfer_stats.throughput = 40_000
+
+    result = await sonic.stream(123, adaptive=True)
+
+    assert result == b"music"
+    mock_request.assert_has_calls(
+        [
+            call("GET", "/getSong", extra_query={"id": 123}),
+            call(
+                "GET",
+                "/stream",
+                extra_query={"id": 123, "maxBitRate": 224, "format": "mp3"},
+                json=False,
+            ),
+        ]
+    )
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_request_decode_inline(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b'{"subsonic-response": {"status": "ok", "foo": "bar"}}'
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+
+    result = await sonic._request(
+        "GET", "/endpoint", transform=lambda data: data["subsonic-response"]["foo"]
+    )
+
+    assert result == "bar"
+    assert sonic.decode_stats.inline == 1
+    assert sonic.decode_stats.offloaded == 0
+    assert sonic.decode_stats.blocking_seconds > 0
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_request_decode_offloaded(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b'{"subsonic-response": {"status": "ok", "foo": "bar"}}'
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+    sonic.decode_threshold = 10
+
+    result = await sonic._request(
+        "GET", "/endpoint", transform=lambda data: data["subsonic-response"]["foo"]
+    )
+
+    assert result == "bar"
+    assert sonic.decode_stats.inline == 0
+    assert sonic.decode_stats.offloaded == 1
+    assert sonic.decode_stats.blocking_seconds == 0
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_request_decode_offloaded_exception(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=(
+            b'{"subsonic-response": {"status": "failed",'
+            b' "error": {"message": "this is a test"}}}'
+        )
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+    sonic.decode_threshold = 10
+
+    with pytest.raises(APIError, match="this is a test"):
+        await sonic._request("GET", "/endpoint")
+
+
+def _album_name(data):
+    return data["subsonic-response"]["album"]["name"]
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_get_album_transform(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/getAlbum"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b'{"subsonic-response": {"status": "ok", "album": {"name": "x"}}}'
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+    sonic.decode_threshold = 10
+
+    assert await sonic.get_album(1, transform=_album_name) == "x"
+    assert sonic.decode_stats.offloaded == 1
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+@patch("aiosonic.sonic_api.aiohttp.ClientSession.get")
+async def test_request_priority(mock_get, mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    mock_get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b"data"
+    )
+    mock_get.return_value.__aenter__.return_value.status = 200
+
+    with sonic.priority(Priority.INTERACTIVE):
+        await sonic._request("GET", "/endpoint", json=False)
+    await sonic._request("GET", "/endpoint", json=False)
+    await sonic._request("GET", "/endpoint", json=False, priority=Priority.BULK)
+
+    stats = sonic.scheduler.stats()
+    assert stats["interactive"]["dispatched"] == 1
+    assert stats["normal"]["dispatched"] == 1
+    assert stats["bulk"]["dispatched"] == 1
+    assert all(stat["in_flight"] == 0 for stat in stats.values())
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._request")
+async def test_get_songs(mock_request, sonic):
+    # pylint: disable=unused-argument
+    async def _request(req_method, endpoint, extra_query=None):
+        if extra_query["id"] == 2:
+            raise APIError("Song not found")
+        return {"subsonic-response": {"song": {"id": extra_query["id"]}}}
+
+    mock_request.side_effect = _request
+
+    results = await sonic.get_songs([1, 2, 1, 3])
+
+    assert [result.item_id for result in results] == [1, 2, 1, 3]
+    assert [result.success for result in results] == [True, False, True, True]
+    assert results[3].result == {"subsonic-response": {"song": {"id": 3}}}
+    assert mock_request.call_count == 3
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._request")
+async def test_iter_albums(mock_request, sonic):
+    mock_request.return_value = {"subsonic-response": {"album": {}}}
+
+    results = [result async for result in sonic.iter_albums(["1", "2", "2"])]
+
+    assert sorted(result.item_id for result in results) == ["1", "2"]
+    mock_request.assert_has_calls(
+        [
+            call("GET", "/getAlbum", extra_query={"id": "1"}, transform=None),
+            call("GET", "/getAlbum", extra_query={"id": "2"}, transform=None),
+        ],
+        any_order=True,
+    )
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._auth_query")
+async def test_authenticate_url(mock_auth_query):
+    mock_auth_query.return_value = {"u": "username", "t": "token"}
+    sonic = sonic_api.SonicAPI("http://foo.tld/", "username", "password")
+
+    assert (
+        await sonic._authenticate_url("http://foo.tld/rest/seg.ts?id=1")
+        == "http://foo.tld/rest/seg.ts?id=1&u=username&t=token"
+    )
+    assert (
+        await sonic._authenticate_url("http://foo.tld/ext/seg.ts?jwt=abc")
+        == "http://foo.tld/ext/seg.ts?jwt=abc"
+    )
+    assert (
+        await sonic._authenticate_url("http://cdn.tld/seg.ts")
+        == "http://cdn.tld/seg.ts"
+    )
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._fetch")
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+async def test_get_hls_playlist(mock_create_url, mock_fetch, sonic):
+    mock_create_url.return_value = "http://foo.tld/rest/hls.m3u8?id=1"
+    mock_fetch.return_value = (
+        b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000000\nhls.m3u8?id=1&bitRate=1000\n"
+    )
+
+    playlist = await sonic.get_hls_playlist(1, bit_rates=[1000, "2000@1280x720"])
+
+    assert playlist.variants[0].uri == "http://foo.tld/rest/hls.m3u8?id=1&bitRate=1000"
+    mock_create_url.assert_called_once_with(
+        "/hls.m3u8", extra_query={"id": 1, "bitRate": ["1000", "2000@1280x720"]}
+    )
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._fetch")
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+async def test_get_hls_playlist_failed(mock_create_url, mock_fetch, sonic):
+    mock_create_url.return_value = "http://foo.tld/rest/hls.m3u8?id=1"
+    mock_fetch.return_value = (
+        b'{"subsonic-response": {"status": "failed",'
+        b' "error": {"message": "video not found"}}}'
+    )
+
+    with pytest.raises(APIError, match="video not found"):
+        await sonic.get_hls_playlist(1)
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._authenticate_url")
+@patch("aiosonic.sonic_api.SonicAPI._fetch")
+@patch("aiosonic.sonic_api.SonicAPI.get_hls_playlist")
+async def test_iter_hls_segments(
+    mock_get_hls_playlist, mock_fetch, mock_authenticate_url, sonic
+):
+    mock_get_hls_playlist.return_value = sonic_api.parse_playlist(
+        "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000\nlow\n"
+        "#EXT-X-STREAM-INF:BANDWIDTH=2000\nhigh\n",
+        base_url="http://foo.tld/",
+    )
+    mock_authenticate_url.side_effect = lambda url: url
+    in_flight = []
+    peak = []
+
+    async def _fetch(req_method, url, json=True):  # pylint: disable=unused-argument
+        if url == "http://foo.tld/high":
+            return (
+                "".join(f"#EXTINF:10,\nseg{i}\n" for i in range(6))
+                .join(["#EXTM3U\n", ""])
+                .encode()
+            )
+        in_flight.append(url)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(url)
+        return url.encode()
+
+    mock_fetch.side_effect = _fetch
+
+    iterator = sonic.iter_hls_segments(1, prefetch=2)
+    segments = [await iterator.__anext__()]
+    await asyncio.sleep(0.005)
+
+    assert in_flight == ["http://foo.tld/seg1", "http://foo.tld/seg2"]
+
+    segments.extend([segment async for segment in iterator])
+
+    assert segments == [f"http://foo.tld/seg{i}".encode() for i in range(6)]
+    assert max(peak) == 2
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._authenticate_url")
+@patch("aiosonic.sonic_api.SonicAPI._fetch")
+@patch("aiosonic.sonic_api.SonicAPI.get_hls_playlist")
+async def test_iter_hls_segments_byte_budget(
+    mock_get_hls_playlist, mock_fetch, mock_authenticate_url, sonic
+):
+    mock_get_hls_playlist.return_value = sonic_api.parse_playlist(
+        "#EXTM3U\n" + "".join(f"#EXTINF:10,\nseg{i}\n" for i in range(4)),
+        base_url="http://foo.tld/",
+    )
+    mock_authenticate_url.side_effect = lambda url: url
+    started = []
+
+    async def _fetch(req_method, url, json=True):  # pylint: disable=unused-argument
+        started.append(url)
+        return b"x" * 100
+
+    mock_fetch.side_effect = _fetch
+
+    iterator = sonic.iter_hls_segments(1, prefetch=3, byte_budget=50)
+    await iterator.__anext__()
+    await asyncio.sleep(0)
+    await iterator.__anext__()
+
+    assert len(started) == 2
+    await iterator.aclose()
+
+
+@pytest.mark.asyncio
+@patch("aiosonic.sonic_api.SonicAPI._create_url")
+async def test_request_shared_session(mock_create_url, sonic):
+    mock_create_url.return_value = "http://foo.bar.tld/endpoint"
+    sonic.session = MagicMock()
+    sonic.session.get.return_value.__aenter__.return_value.read = CoroutineMock(
+        return_value=b"data"
+    )
+    sonic.session.get.return_value.__aenter__.return_value.status = 200
+
+    await sonic._request("GET", "/endpoint", json=False)
+    await sonic._request("GET", "/endpoint", json=False)
+
+    assert sonic.session.get.call_count == 2
@@ -0,0 +1,44 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from aiosonic.throughput import TransferStats, select_quality
+
+SONG = {"bitRate": 997, "duration": 180, "suffix": "flac", "transcodedSuffix": "mp3"}
+
+
+def test_transfer_stats_smoothing():
+    stats = TransferStats(alpha=0.5, min_bytes=10)
+
+    stats.record_transfer(1000, 1.0)
+    stats.record_transfer(3000, 1.0)
+    stats.record_latency(0.2)
+    stats.record_latency(0.4)
+
+    assert stats.throughput == 2000
+    assert stats.latency == pytest.approx(0.3)
+
+
+def test_transfer_stats_ignores_small_transfers():
+    stats = TransferStats(min_bytes=1024)
+
+    stats.record_transfer(100, 0.5)
+
+    assert stats.throughput is None
+
+
+@pytest.mark.parametrize(
+    "throughput,latency,song,expected",
+    [
+        (None, None, SONG, {"maxBitRate": 128, "format": "mp3"}),
+        (1_000_000, None, SONG, {"maxBitRate": 0}),
+        (40_000, None, SONG, {"maxBitRate": 224, "format": "mp3"}),
+        (40_000, 90, SONG, {"maxBitRate": 112, "format": "mp3"}),
+        (1_000, None, SONG, {"maxBitRate": 32, "format": "mp3"}),
+        (40_000, None, {"bitRate": 320}, {"maxBitRate": 224}),
+        (40_000, None, {"bitRate": 128}, {"maxBitRate": 0}),
+    ],
+)
+def test_select_quality(throughput, latency, song, expected):
+    stats = TransferStats(throughput=throughput, latency=latency)
+
+    assert select_quality(song, stats) == expected